@@ -1,8 +1,12 @@
-"""CLI entrypoint for PyJam"""
+"""
+CLI entrypoint for PyJam. Clients are imported by the commands that use
+them, so boto3 is only loaded once a command runs and `jam --help` stays
+fast. Check with `python startup_benchmark.py` after changing imports.
+"""
 
+import sys
 import click
-from pyjam.constants import VERSION
-from pyjam.clients import S3Client, Route53Client, CloudFrontClient, ACMClient
+from pyjam.constants import VERSION, MAX_CONCURRENCY, COMPRESS_MIN_SIZE
 
 
 @click.group()
@@ -35,21 +39,29 @@ def lst():
     help='Specify the AWS profile to use as credentials.')
 def list_buckets(**kwargs):
     """Lists all S3 buckets [options]"""
+    from pyjam.clients import S3Client
+
     client = S3Client(**kwargs)
     return client.print_buckets()
 
 
 @lst.command('bucket')
 @click.argument('bucket_name')
+@click.option(
+    '--prefix',
+    default='',
+    help='Only list objects whose keys start with this prefix.')
 @click.option(
     '--profile',
     'profile_name',
     default=None,
     help='Specify the AWS profile to use as credentials.')
-def list_bucket_objects(bucket_name, **kwargs):
+def list_bucket_objects(bucket_name, prefix, **kwargs):
     """Lists objects in an S3 bucket [options]"""
+    from pyjam.clients import S3Client
+
     client = S3Client(**kwargs)
-    return client.print_objects(bucket_name)
+    return client.print_objects(bucket_name, prefix)
 
 
 """
@@ -59,16 +71,367 @@ PyJam sync command
 
 @cli.command('sync')
 @click.argument('path', type=click.Path(exists=True))
-@click.argument('bucket')
+@click.argument('buckets', nargs=-1, required=True)
+@click.option(
+    '--concurrency',
+    type=click.IntRange(min=1),
+    default=MAX_CONCURRENCY,
+    help='Specify the number of files to upload in parallel.')
+@click.option(
+    '--max-bandwidth',
+    type=click.FloatRange(min=0.01),
+    default=None,
+    help='Cap the upload bandwidth of all transfers together, in MB/s.')
+@click.option(
+    '--rehash',
+    is_flag=True,
+    default=False,
+    help='Ignore the local checksum cache and rehash every file.')
+@click.option(
+    '--exclude',
+    'excludes',
+    multiple=True,
+    help='Skip files and directories matching a glob (repeatable).')
+@click.option(
+    '--dry-run',
+    is_flag=True,
+    default=False,
+    help='Print the sync plan without uploading or deleting anything.')
+@click.option(
+    '--output',
+    type=click.Choice(['summary', 'json']),
+    default='summary',
+    help='Specify the format of the --dry-run plan.')
+@click.option(
+    '--invalidate',
+    is_flag=True,
+    default=False,
+    help='Invalidate changed paths in the CloudFront distribution.')
+@click.option(
+    '--wait',
+    is_flag=True,
+    default=False,
+    help='Wait for the CloudFront invalidation to complete.')
+@click.option(
+    '--compress',
+    type=click.Choice(['gzip', 'br']),
+    default=None,
+    help='Pre-compress text-like files and set their Content-Encoding.')
+@click.option(
+    '--compress-level',
+    type=click.IntRange(min=0, max=11),
+    default=None,
+    help='Specify the compression level, 1-9 for gzip and 0-11 for br '
+    '(default: 9 for gzip, 11 for br).')
+@click.option(
+    '--compress-min-size',
+    type=click.IntRange(min=0),
+    default=COMPRESS_MIN_SIZE,
+    help='Specify the smallest file size in bytes to compress.')
+@click.option(
+    '--headers',
+    'headers_file',
+    type=click.Path(exists=True, dir_okay=False),
+    default=None,
+    help='Specify a JSON file of glob patterns to headers '
+    '(default: PATH/.jamheaders).')
+@click.option(
+    '--fingerprint',
+    is_flag=True,
+    default=False,
+    help='Add content hashes to CSS, JS and image file names '
+    'and rewrite references to them.')
+@click.option(
+    '--full-listing',
+    is_flag=True,
+    default=False,
+    help='List the whole bucket instead of reading the sync manifest.')
+@click.option(
+    '--stream',
+    is_flag=True,
+    default=False,
+    help='Merge the local tree with the bucket listing in key order, '
+    'keeping memory flat for very large trees.')
+@click.option(
+    '--watch',
+    is_flag=True,
+    default=False,
+    help='Keep watching PATH after syncing and sync changed files.')
 @click.option(
     '--profile',
     'profile_name',
     default=None,
     help='Specify the AWS profile to use as credentials.')
-def sync(path, bucket, **kwargs):
-    """Command for syncing contents of PATH recursively to S3 BUCKET"""
-    client = S3Client(**kwargs)
-    return client.sync_to_bucket(path, bucket)
+def sync(path, buckets, rehash, excludes, dry_run, output, invalidate, wait,
+         compress, compress_level, compress_min_size, headers_file,
+         fingerprint, full_listing, stream, watch, concurrency, max_bandwidth,
+         profile_name):
+    """Command for syncing contents of PATH recursively to S3 BUCKETS"""
+    from pyjam.clients import S3Client, CloudFrontClient
+    from pyjam.utils.compress import Compression, DEFAULT_LEVELS, \
+    LEVEL_RANGES, brotli_available
+
+    compression = None
+
+    if stream and (fingerprint or invalidate or len(buckets) > 1):
+        print('Error: --stream syncs to a single bucket and cannot be used '
+              'with --fingerprint or --invalidate.')
+        return
+
+    if watch and (stream or fingerprint or invalidate or dry_run or
+                  len(buckets) > 1):
+        print('Error: --watch syncs to a single bucket and cannot be used '
+              'with --stream, --fingerprint, --invalidate or --dry-run.')
+        return
+
+    if compress:
+        if compress == 'br' and not brotli_available():
+            print('Error: brotli is not installed. '
+                  'Please run `pip3 install brotli` first.')
+            return
+
+        level = DEFAULT_LEVELS[compress] if compress_level is None \
+        else compress_level
+        lowest, highest = LEVEL_RANGES[compress]
+
+        if not lowest <= level <= highest:
+            print('Error: --compress-level must be between {0} and {1} '
+                  'for {2}.'.format(lowest, highest, compress))
+            return
+
+        compression = Compression(compress, level, compress_min_size)
+
+    client = S3Client(
+        concurrency=concurrency,
+        max_bandwidth=int(max_bandwidth * 1024 * 1024)
+        if max_bandwidth else None,
+        profile_name=profile_name)
+    options = dict(
+        rehash=rehash,
+        excludes=excludes,
+        dry_run=dry_run,
+        output=output,
+        compression=compression,
+        headers_file=headers_file,
+        fingerprint=fingerprint,
+        full_listing=full_listing)
+
+    if watch:
+        client.watch_bucket(
+            path,
+            buckets[0],
+            rehash=rehash,
+            excludes=excludes,
+            compression=compression,
+            headers_file=headers_file,
+            full_listing=full_listing)
+        return
+
+    if len(buckets) == 1:
+        plans = {
+            buckets[0]:
+            client.sync_to_bucket(path, buckets[0], stream=stream, **options)
+        }
+    else:
+        plans = client.sync_to_buckets(path, buckets, **options)
+
+    if invalidate and not dry_run:
+        for bucket, plan in plans.items():
+            if plan:
+                changed = [
+                    action.key
+                    for action in plan.uploads + plan.copies + plan.updates +
+                    plan.deletes
+                ]
+                all_keys = plan.local_keys | set(plan.remote)
+                CloudFrontClient(profile_name=profile_name).invalidate(
+                    bucket, changed, all_keys, wait=wait)
+
+    if not all(plan and not plan.failed for plan in plans.values()):
+        sys.exit(1)
+
+
+"""
+PyJam deploy command
+"""
+
+
+@cli.command('deploy')
+@click.argument('path', type=click.Path(exists=True))
+@click.argument('domain_name')
+@click.option(
+    '--region',
+    'region_name',
+    default=None,
+    help='Specify the AWS region to create the bucket.')
+@click.option(
+    '--concurrency',
+    type=click.IntRange(min=1),
+    default=MAX_CONCURRENCY,
+    help='Specify the number of files to upload in parallel.')
+@click.option(
+    '--exclude',
+    'excludes',
+    multiple=True,
+    help='Skip files and directories matching a glob (repeatable).')
+@click.option(
+    '--restart',
+    is_flag=True,
+    default=False,
+    help='Run every step again instead of resuming an incomplete deploy.')
+@click.option(
+    '--no-wait',
+    is_flag=True,
+    default=False,
+    help='Do not wait for the CloudFront distribution to finish deploying.')
+@click.option(
+    '--profile',
+    'profile_name',
+    default=None,
+    help='Specify the AWS profile to use as credentials.')
+def deploy(path, domain_name, region_name, concurrency, excludes, restart,
+           no_wait, profile_name):
+    """
+    Command for deploying PATH to DOMAIN_NAME: bucket, sync, certificate,
+    CloudFront and domain records, running independent steps concurrently
+    """
+    from pyjam.clients import S3Client, Route53Client, CloudFrontClient, \
+    ACMClient
+    from pyjam.utils.deploy import DeployState, Step, run_steps, DONE
+
+    state = DeployState(domain_name)
+
+    if restart:
+        state.clear()
+
+    elif state.completed:
+        print('Resuming deploy of {0}, already done: {1}'.format(
+            domain_name, ', '.join(sorted(state.completed))))
+
+    def setup_bucket():
+        client = S3Client(region_name=region_name, profile_name=profile_name)
+        return client.setup_hosting_bucket(domain_name)
+
+    def sync_bucket():
+        client = S3Client(concurrency=concurrency, profile_name=profile_name)
+        plan = client.regional_client(domain_name).sync_to_bucket(
+            path, domain_name, excludes=excludes)
+        return plan is not None and not plan.failed
+
+    def setup_certificate():
+        if CloudFrontClient(
+                profile_name=profile_name).find_matching_cert(domain_name):
+            print('\nFound certificate for {0}'.format(domain_name))
+            return True
+
+        return ACMClient(
+            profile_name=profile_name).request_certificate(domain_name)
+
+    def setup_cloudfront():
+        client = CloudFrontClient(profile_name=profile_name)
+
+        if client.find_matching_distribution(domain_name):
+            print('\nFound distribution for {0}'.format(domain_name))
+            return True
+
+        return client.create_distribution(domain_name, wait=not no_wait)
+
+    def setup_domain():
+        return Route53Client(
+            profile_name=profile_name).create_cf_domain_record(domain_name)
+
+    status = run_steps(
+        [
+            Step('bucket', setup_bucket, ()),
+            Step('sync', sync_bucket, ('bucket', )),
+            Step('certificate', setup_certificate, ()),
+            Step('cloudfront', setup_cloudfront, ('bucket', 'certificate')),
+            Step('domain', setup_domain, ('cloudfront', ))
+        ],
+        completed=state.completed,
+        on_done=state.add)
+
+    print('\nDeploy of {0}:'.format(domain_name))
+
+    for name, step_status in status.items():
+        print('  {0:<12} {1}'.format(name, step_status))
+
+    if any(step_status != DONE for step_status in status.values()):
+        print('\nRun `jam deploy` again to resume from the incomplete steps.')
+        sys.exit(1)
+
+    state.clear()
+
+
+"""
+PyJam status command
+"""
+
+
+@cli.command('status')
+@click.argument('domain_names', nargs=-1)
+@click.option(
+    '--wait',
+    is_flag=True,
+    default=False,
+    help='Keep checking until no certificate or distribution is pending.')
+@click.option(
+    '--profile',
+    'profile_name',
+    default=None,
+    help='Specify the AWS profile to use as credentials.')
+def status(domain_names, wait, profile_name):
+    """
+    Command for checking the certificates and distributions of DOMAIN_NAMES,
+    or all that are pending [options]
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    from pyjam.clients import CloudFrontClient, ACMClient
+    from pyjam.constants import VALIDATION_TIMEOUT
+    from pyjam.utils.poll import poll
+
+    acm = ACMClient(profile_name=profile_name)
+    cloudfront = CloudFrontClient(profile_name=profile_name)
+
+    def sweep():
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            certificates = executor.submit(acm.certificate_statuses,
+                                           domain_names)
+            distributions = executor.submit(
+                cloudfront.distribution_statuses, domain_names)
+
+            return certificates.result(), distributions.result()
+
+    def check():
+        certificates, distributions = sweep()
+        pending = [
+            cert['DomainName'] for cert in certificates
+            if cert['Status'] == 'PENDING_VALIDATION'
+        ] + [
+            distribution['Id'] for distribution in distributions
+            if distribution['Status'] != 'Deployed'
+        ]
+
+        if wait and pending:
+            print('Still pending: {0}'.format(', '.join(pending)))
+            return None
+
+        return certificates, distributions
+
+    certificates, distributions = poll(check, VALIDATION_TIMEOUT) or sweep()
+
+    print('\nCertificates:')
+
+    for cert in certificates:
+        print('  {0:<40} {1:<20} {2}'.format(
+            cert['DomainName'], cert['Status'], cert['CertificateArn']))
+
+    print('\nDistributions:')
+
+    for distribution in distributions:
+        print('  {0:<40} {1:<20} {2}'.format(
+            ', '.join(distribution['Aliases'].get('Items', [])),
+            distribution['Status'], distribution['Id']))
 
 
 """
@@ -99,6 +462,8 @@ def setup_bucket(bucket_name, **kwargs):
     Setup S3 bucket for website hosting.
     Ensure bucket name is the same as domain [options]
     """
+    from pyjam.clients import S3Client
+
     client = S3Client(**kwargs)
     return client.setup_hosting_bucket(bucket_name)
 
@@ -125,6 +490,8 @@ def setup_domain(domain_name, s3, cf, **kwargs):
     Setup Route53 domain for hosting S3 website
     or CloudFront Distribution [options]
     """
+    from pyjam.clients import Route53Client
+
     client = Route53Client(**kwargs)
     if not s3 and not cf:
         print('Error: please specify an option (--s3 or --cf)')
@@ -136,28 +503,44 @@ def setup_domain(domain_name, s3, cf, **kwargs):
 
 @setup.command('cloudfront')
 @click.argument('bucket_name')
+@click.option(
+    '--no-wait',
+    is_flag=True,
+    default=False,
+    help='Return once the distribution is created, without waiting for it '
+    'to deploy.')
 @click.option(
     '--profile',
     'profile_name',
     default=None,
     help='Specify the AWS profile to use as credentials.')
-def setup_cloudfront(bucket_name, **kwargs):
+def setup_cloudfront(bucket_name, no_wait, **kwargs):
     """Setup CloudFront Distribution for S3 bucket [options]"""
+    from pyjam.clients import CloudFrontClient
+
     client = CloudFrontClient(**kwargs)
-    client.create_distribution(bucket_name)
+    client.create_distribution(bucket_name, wait=not no_wait)
 
 
 @setup.command('certificate')
 @click.argument('domain_name')
+@click.option(
+    '--no-wait',
+    is_flag=True,
+    default=False,
+    help='Return once the certificate is requested, without waiting for it '
+    'to be validated.')
 @click.option(
     '--profile',
     'profile_name',
     default=None,
     help='Specify the AWS profile to use as credentials.')
-def setup_certificate(domain_name, **kwargs):
+def setup_certificate(domain_name, no_wait, **kwargs):
     """Setup ACM Certificate used by CloudFront [options]"""
+    from pyjam.clients import ACMClient
+
     client = ACMClient(**kwargs)
-    client.request_certificate(domain_name)
+    client.request_certificate(domain_name, wait=not no_wait)
 
 
 if __name__ == '__main__':
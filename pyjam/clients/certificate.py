@@ -1,9 +1,12 @@
 """ACM Client for PyJam"""
 
-from time import sleep
-import boto3
 from botocore.exceptions import ClientError
+from pyjam.constants import MAX_CONCURRENCY, CERTIFICATE_READY_TIMEOUT, \
+VALIDATION_TIMEOUT
+from pyjam.utils.poll import poll
+from pyjam.utils.pool import bounded_map
 from pyjam.utils.route53 import find_hosted_zone, create_hosted_zone
+from pyjam.utils.session import get_client
 
 
 class ACMClient:
@@ -11,11 +14,18 @@ class ACMClient:
 
     def __init__(self, **kwargs):
         """Create a DistributionManager."""
-        params = {k: v for k, v in kwargs.items() if v is not None}
+        self.profile_name = kwargs.get('profile_name')
 
-        self.session = boto3.Session(**params)
-        self.acm = self.session.client('acm', region_name='us-east-1')
-        self.route53 = self.session.client('route53')
+    @property
+    def acm(self):
+        """ACM client in us-east-1, where CloudFront reads certificates"""
+        return get_client(
+            'acm', profile_name=self.profile_name, region_name='us-east-1')
+
+    @property
+    def route53(self):
+        """Route53 client, created on first use"""
+        return get_client('route53', profile_name=self.profile_name)
 
     def describe_certificate(self, certificate_arn):
         """Describes an ACM certificate based on ARN"""
@@ -79,8 +89,30 @@ class ACMClient:
                 'Unable to create CNAME record for validation of domain {0}. '.
                 format(domain_name) + str(err) + '\n')
 
-    def request_certificate(self, domain_name):
-        """Requests an ACM SSL certificate for your domain"""
+    def await_validation_records(self, certificate_arn):
+        """
+        Wait for ACM to generate the DNS records that validate the
+        certificate. Returns the certificate, or None if it timed out.
+        """
+
+        def check():
+            certificate = self.acm.describe_certificate(
+                CertificateArn=certificate_arn)['Certificate']
+            options = certificate.get('DomainValidationOptions', [])
+
+            if options and all('ResourceRecord' in option
+                               for option in options):
+                return certificate
+
+            return None
+
+        return poll(check, CERTIFICATE_READY_TIMEOUT, initial=1)
+
+    def request_certificate(self, domain_name, wait=True):
+        """
+        Requests an ACM SSL certificate for your domain. Returns its ARN
+        once it is validated, or as soon as it is requested without wait.
+        """
         try:
             alt_name = '*.' + domain_name if domain_name[
                 0] != '*' else domain_name[2:]
@@ -96,30 +128,78 @@ class ACMClient:
                 ])
 
             certificate_arn = response['CertificateArn']
-            sleep(6)
-            certificate = self.describe_certificate(
-                certificate_arn)['Certificate']
+            certificate = self.await_validation_records(certificate_arn)
+
+            if not certificate:
+                print('\nError: ACM did not provide validation records for '
+                      '{0}. Please try again.'.format(certificate_arn))
+                return None
+
             success = self.create_validation_record(domain_name, certificate)
 
-            if success:
-                self.await_validation(certificate_arn)
+            if success and not wait:
+                print('\nCertificate requested: {0}'.format(certificate_arn))
+                print('Run `jam status {0}` to check its validation.'.format(
+                    domain_name))
+                return certificate_arn
+
+            if success and self.await_validation(certificate_arn):
+                return certificate_arn
 
         except ClientError as err:
             print('Unable to request certificate for {0}. '.format(domain_name)
                   + str(err) + '\n')
 
     def await_validation(self, certificate_arn):
-        """Wait for certificate to be validated"""
-        waiter = self.acm.get_waiter('certificate_validated')
+        """Wait for certificate to be validated. Returns True if it was"""
+
+        def check():
+            status = self.acm.describe_certificate(
+                CertificateArn=certificate_arn)['Certificate']['Status']
+
+            if status == 'PENDING_VALIDATION':
+                return None
+
+            return status
 
         print('Awaiting Certificate validation...')
         print('This may take some time.')
 
-        waiter.wait(
-            CertificateArn=certificate_arn,
-            WaiterConfig={
-                'Delay': 30,
-                'MaxAttempts': 80
-            })
+        status = poll(check, VALIDATION_TIMEOUT)
+
+        if status == 'ISSUED':
+            print('\nSuccess!')
+            return True
 
-        print('\nSuccess!')
+        print('\nError: certificate {0} is {1}.'.format(
+            certificate_arn, status or 'still pending validation'))
+        return False
+
+    def certificate_statuses(self, domain_names=(),
+                             concurrency=MAX_CONCURRENCY):
+        """
+        Describe the certificates for domain_names, or all certificates
+        pending validation, concurrently. Returns their descriptions.
+        """
+        try:
+            paginator = self.acm.get_paginator('list_certificates')
+            params = {} if domain_names else {
+                'CertificateStatuses': ['PENDING_VALIDATION']
+            }
+            arns = [
+                cert['CertificateArn']
+                for page in paginator.paginate(**params)
+                for cert in page['CertificateSummaryList']
+                if not domain_names or cert['DomainName'] in domain_names
+            ]
+
+            return sorted(
+                bounded_map(
+                    lambda arn: self.acm.describe_certificate(
+                        CertificateArn=arn)['Certificate'], arns,
+                    concurrency),
+                key=lambda cert: cert['DomainName'])
+
+        except ClientError as err:
+            print('Unable to check certificates. ' + str(err) + '\n')
+            return []
@@ -1,9 +1,12 @@
 """CloudFront Client for PyJam"""
 
 import uuid
-import boto3
 from botocore.exceptions import ClientError
+from pyjam.constants import DEPLOY_TIMEOUT, INVALIDATION_TIMEOUT
+from pyjam.utils.poll import poll
 from pyjam.utils.s3 import get_endpoint, get_bucket_region
+from pyjam.utils.cloudfront import find_distribution, invalidation_paths
+from pyjam.utils.session import get_client
 
 
 class CloudFrontClient:
@@ -11,11 +14,23 @@ class CloudFrontClient:
 
     def __init__(self, **kwargs):
         """Create a DistributionManager."""
-        params = {k: v for k, v in kwargs.items() if v is not None}
+        self.profile_name = kwargs.get('profile_name')
 
-        self.session = boto3.Session(**params)
-        self.cloudfront = self.session.client('cloudfront')
-        self.acm = self.session.client('acm', region_name='us-east-1')
+    @property
+    def cloudfront(self):
+        """CloudFront client, created on first use"""
+        return get_client('cloudfront', profile_name=self.profile_name)
+
+    @property
+    def acm(self):
+        """ACM client in us-east-1, where CloudFront reads certificates"""
+        return get_client(
+            'acm', profile_name=self.profile_name, region_name='us-east-1')
+
+    @property
+    def s3(self):
+        """S3 client, created on first use"""
+        return get_client('s3', profile_name=self.profile_name)
 
     def certificate_matches(self, certificate_arn, domain_name):
         """Return True if certificate matches domain_name"""
@@ -43,10 +58,18 @@ class CloudFrontClient:
 
         return None
 
-    def create_distribution(self, bucket_name):
-        """Create a CloudFront distribution for domain with certificate"""
+    def find_matching_distribution(self, domain_name):
+        """Find a CloudFront distribution with matching domain"""
+        return find_distribution(self.cloudfront, domain_name)
+
+    def create_distribution(self, bucket_name, wait=True):
+        """
+        Create a CloudFront distribution for domain with certificate.
+        Returns the distribution once deployed, or as soon as it is
+        created without wait.
+        """
         try:
-            region = get_bucket_region(self.session, bucket_name)
+            region = get_bucket_region(self.s3, bucket_name)
             origin_id = 'S3-Website-' + '{0}.{1}'.format(
                 bucket_name,
                 get_endpoint(region).host)
@@ -120,26 +143,125 @@ class CloudFrontClient:
                     'IsIPV6Enabled': True
                 })
 
-            self.await_deploy(response['Distribution'])
+            distribution = response['Distribution']
+
+            if not wait:
+                print('\nDistribution created: https://{0}'.format(
+                    distribution['DomainName']))
+                print('Run `jam status {0}` to check its deployment.'.format(
+                    bucket_name))
+                return distribution
+
+            if self.await_deploy(distribution):
+                return distribution
 
         except ClientError as err:
             print('Unable to create distribution for {0}. '.format(bucket_name)
                   + str(err) + '\n')
 
     def await_deploy(self, distribution):
-        """Wait for distribution to be deployed"""
-        waiter = self.cloudfront.get_waiter('distribution_deployed')
+        """Wait for distribution to be deployed. Returns True if it was"""
+
+        def check():
+            response = self.cloudfront.get_distribution(Id=distribution['Id'])
+            return True \
+            if response['Distribution']['Status'] == 'Deployed' else None
 
         print('\nDomain configured: https://{0}'.format(
             distribution['DomainName']))
         print('This may take some time.')
         print('...')
 
-        waiter.wait(
-            Id=distribution['Id'],
-            WaiterConfig={
-                'Delay': 30,
-                'MaxAttempts': 80
-            })
+        if poll(check, DEPLOY_TIMEOUT):
+            print('\nSuccess!')
+            return True
+
+        print('\nError: distribution {0} is still deploying.'.format(
+            distribution['Id']))
+        return False
+
+    def distribution_statuses(self, domain_names=()):
+        """
+        Return the distributions serving domain_names, or all that are
+        still deploying.
+        """
+        distributions = []
+
+        try:
+            paginator = self.cloudfront.get_paginator('list_distributions')
+
+            for page in paginator.paginate():
+                for distribution in page['DistributionList'].get('Items', []):
+                    aliases = distribution['Aliases'].get('Items', [])
+
+                    if domain_names:
+                        matches = any(alias in domain_names
+                                      for alias in aliases)
+                    else:
+                        matches = distribution['Status'] != 'Deployed'
+
+                    if matches:
+                        distributions.append(distribution)
+
+            return distributions
+
+        except ClientError as err:
+            print('Unable to check distributions. ' + str(err) + '\n')
+            return []
+
+    def invalidate(self, bucket_name, changed, all_keys, wait=False):
+        """Invalidate changed keys in the distribution serving bucket"""
+        try:
+            distribution = find_distribution(self.cloudfront, bucket_name)
+
+            if not distribution:
+                print(
+                    '\nError: matching CloudFront distribution does not exist.'
+                )
+                return
+
+            paths = invalidation_paths(changed, all_keys)
 
-        print('\nSuccess!')
+            if not paths:
+                print('\nNo changes to invalidate.')
+                return
+
+            print('\nInvalidating {0} path(s) in distribution {1}...'.format(
+                len(paths), distribution['Id']))
+
+            response = self.cloudfront.create_invalidation(
+                DistributionId=distribution['Id'],
+                InvalidationBatch={
+                    'Paths': {
+                        'Quantity': len(paths),
+                        'Items': paths
+                    },
+                    'CallerReference': str(uuid.uuid4())
+                })
+
+            if wait:
+                self.await_invalidation(distribution['Id'],
+                                        response['Invalidation']['Id'])
+
+        except ClientError as err:
+            print('Unable to invalidate distribution for {0}. '.format(
+                bucket_name) + str(err) + '\n')
+
+    def await_invalidation(self, distribution_id, invalidation_id):
+        """Wait for invalidation to be completed. Returns True if it was"""
+
+        def check():
+            response = self.cloudfront.get_invalidation(
+                DistributionId=distribution_id, Id=invalidation_id)
+            return True \
+            if response['Invalidation']['Status'] == 'Completed' else None
+
+        print('Awaiting invalidation {0}...'.format(invalidation_id))
+
+        if poll(check, INVALIDATION_TIMEOUT):
+            print('\nSuccess!')
+            return True
+
+        print('\nError: invalidation {0} is still in progress.'.format(
+            invalidation_id))
+        return False
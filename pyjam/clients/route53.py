@@ -1,9 +1,10 @@
 """Route53 Client for PyJam"""
 
-import boto3
 from botocore.exceptions import ClientError
 from pyjam.utils.s3 import set_bucket_policy, set_website_config, get_endpoint, get_bucket_region
 from pyjam.utils.route53 import find_hosted_zone, create_hosted_zone
+from pyjam.utils.cloudfront import find_distribution
+from pyjam.utils.session import get_account_id, get_client, get_resource
 
 
 class Route53Client:
@@ -11,19 +12,29 @@ class Route53Client:
 
     def __init__(self, **kwargs):
         """Setup Route53 Client Configurations"""
-        params = {k: v for k, v in kwargs.items() if v is not None}
+        self.profile_name = kwargs.get('profile_name')
 
-        self.session = boto3.Session(**params)
-        self.route53 = self.session.client('route53')
-        self.s3 = self.session.resource('s3')
-        self.cloudfront = self.session.client('cloudfront')
+    @property
+    def route53(self):
+        """Route53 client, created on first use"""
+        return get_client('route53', profile_name=self.profile_name)
+
+    @property
+    def s3(self):
+        """S3 resource, created on first use"""
+        return get_resource('s3', profile_name=self.profile_name)
+
+    @property
+    def cloudfront(self):
+        """CloudFront client, created on first use"""
+        return get_client('cloudfront', profile_name=self.profile_name)
 
     def find_matching_bucket(self, domain_name):
         """Find a S3 bucket with matching domain"""
         try:
             bucket = self.s3.Bucket(domain_name)
             print('\nFound bucket s3://{0}'.format(domain_name))
-            set_bucket_policy(bucket)
+            set_bucket_policy(bucket, get_account_id(self.profile_name))
             set_website_config(bucket)
 
         except ClientError as err:
@@ -36,21 +47,14 @@ class Route53Client:
 
     def find_matching_distribution(self, domain_name):
         """Find a CloudFront distribution with matching domain"""
-        paginator = self.cloudfront.get_paginator('list_distributions')
-        for page in paginator.paginate():
-            for distribution in page['DistributionList'].get('Items', []):
-                for alias in distribution['Aliases']['Items']:
-                    if alias == domain_name:
-                        return distribution
-
-        return {}
+        return find_distribution(self.cloudfront, domain_name) or {}
 
     def create_s3_domain_record(self, domain_name):
         """Create a domain record in hosted zone for S3 Hosting"""
 
         try:
             self.find_matching_bucket(domain_name)
-            region = get_bucket_region(self.session, domain_name)
+            region = get_bucket_region(self.s3.meta.client, domain_name)
             zone = find_hosted_zone(self.route53, domain_name) \
             or create_hosted_zone(self.route53, domain_name)
             endpoint = get_endpoint(region)
@@ -138,6 +142,7 @@ class Route53Client:
                 })
 
             print('\nDomain configured: https://{0}'.format(domain_name))
+            return True
 
         except ClientError as err:
             print('Unable to create Alias record for {0}. '.format(domain_name)
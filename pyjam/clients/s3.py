@@ -1,50 +1,157 @@
 """S3 Client for PyJam"""
 
+import os
+import sys
+import json
+import time
 import mimetypes
+from functools import partial
 from pathlib import Path
 import boto3
-from botocore.exceptions import ClientError
+from boto3.exceptions import S3UploadFailedError
+from botocore.exceptions import BotoCoreError, ClientError
+from s3transfer.utils import ReadFileChunk
 
 from pyjam.utils.s3 import set_bucket_policy, set_website_config, get_endpoint, get_bucket_region
-from pyjam.utils.checksum import generate_checksum
-from pyjam.constants import CHUNK_SIZE
+from pyjam.utils.cache import ChecksumCache
+from pyjam.utils.checksum import choose_part_size, generate_checksum
+from pyjam.utils.headers import HeaderRules, object_headers
+from pyjam.utils.journal import SyncJournal
+from pyjam.utils.listing import iter_objects, list_objects
+from pyjam.utils.manifest import load_manifest, invalidate_manifest, \
+write_manifest
+from pyjam.utils.pipeline import KeySpool, apply_headers, local_files, \
+match_part_sizes, merge_remote
+from pyjam.utils.plan import SyncPlan, COPY, SKIP, UPDATE
+from pyjam.utils.retry import RetryQueue, TRANSFER_ERRORS
+from pyjam.utils.session import get_account_id, get_client, get_resource, \
+get_session
+from pyjam.utils.pool import bounded_map, batched
+from pyjam.utils.throttle import AdaptiveLimiter, BandwidthLimiter, \
+error_code
+from pyjam.utils.walk import IgnoreRules, walk_files, walk_keys
+from pyjam.utils.watch import get_watcher
+from pyjam.constants import MAX_CONCURRENCY, DELETE_BATCH_SIZE, \
+LISTING_BATCH_SIZE, MANIFEST_KEY, MULTIPART_MAX_AGE, PART_CONCURRENCY
 
 
 class S3Client:
     """Class for S3 Client"""
 
-    def __init__(self, **kwargs):
-        """Setup S3 Client Configurations"""
+    def __init__(self,
+                 concurrency=MAX_CONCURRENCY,
+                 max_bandwidth=None,
+                 **kwargs):
+        """
+        Setup S3 Client Configurations. max_bandwidth caps the bytes per
+        second uploaded by all transfers together.
+        """
         params = {k: v for k, v in kwargs.items() if v is not None}
 
-        self.session = boto3.Session(**params)
-        self.s3 = self.session.resource('s3')
-        self.transfer_config = boto3.s3.transfer.TransferConfig(
-            multipart_chunksize=CHUNK_SIZE, multipart_threshold=CHUNK_SIZE)
+        self.concurrency = concurrency
+        self.limiter = AdaptiveLimiter(concurrency)
+        self.bandwidth = BandwidthLimiter(max_bandwidth) \
+        if max_bandwidth else None
+        self.params = params
+        self.profile_name = params.get('profile_name')
+        self.region_name = params.get('region_name')
+        self.transfer_configs = {}
         self.checksums = {}
+        self.remote_headers = {}
         self.new_checksums = {}
+        self.journal = None
+
+    @property
+    def session(self):
+        """Session shared by every client with the same profile"""
+        return get_session(self.profile_name)
+
+    @property
+    def s3(self):
+        """S3 resource, created on first use and shared between clients"""
+        return get_resource(
+            's3',
+            profile_name=self.profile_name,
+            region_name=self.region_name,
+            max_pool_connections=self.concurrency)
+
+    @property
+    def transfers(self):
+        """
+        S3 client for the requests sent through the limiter. It does not
+        retry, so the limiter sees every throttled request. Every file in
+        flight may send PART_CONCURRENCY parts at once, so the pool holds
+        a connection for each of them.
+        """
+        return get_client(
+            's3',
+            profile_name=self.profile_name,
+            region_name=self.region_name,
+            max_pool_connections=self.concurrency * PART_CONCURRENCY,
+            max_attempts=1)
+
+    def get_transfer_config(self, size):
+        """
+        Get the transfer config for a file of size bytes. Its part size
+        matches the one generate_checksum uses, and files of exactly one
+        part are sent in a single request, so ETags agree. Each file
+        sends at most PART_CONCURRENCY parts at once.
+        """
+        part_size = choose_part_size(size)
+
+        if part_size not in self.transfer_configs:
+            self.transfer_configs[part_size] = \
+            boto3.s3.transfer.TransferConfig(
+                multipart_chunksize=part_size,
+                multipart_threshold=part_size + 1,
+                max_concurrency=PART_CONCURRENCY)
+
+        return self.transfer_configs[part_size]
 
     def get_bucket_endpoint(self, bucket_name):
         """Get the S3 endpoints for this bucket."""
-        return get_endpoint(get_bucket_region(self.session, bucket_name))
+        return get_endpoint(get_bucket_region(self.s3.meta.client, bucket_name))
 
     def get_bucket_url(self, bucket_name):
         """Get the website URL for this bucket."""
         return "http://{}.{}".format(
             bucket_name,
-            get_endpoint(get_bucket_region(self.session, bucket_name)).host)
-
-    def load_checksums(self, bucket_name):
-        """Load etag metadata for caching purposes."""
-        paginator = self.s3.meta.client.get_paginator('list_objects_v2')
-        for page in paginator.paginate(Bucket=bucket_name):
-            for obj in page.get('Contents', []):
+            get_endpoint(get_bucket_region(self.s3.meta.client, bucket_name)).host)
+
+    def load_checksums(self, bucket_name, full_listing=False):
+        """
+        Load etag metadata for caching purposes. The manifest left by the
+        last sync is used when valid, then the local journal of a sync
+        that was interrupted, otherwise the bucket is listed.
+        """
+        manifest = None if full_listing else load_manifest(
+            self.s3.meta.client, bucket_name)
+
+        if not manifest and not full_listing:
+            with SyncJournal() as journal:
+                manifest = journal.remote(bucket_name)
+
+            if manifest:
+                print('\nResuming interrupted sync to {0}.'.format(
+                    bucket_name))
+
+        if manifest:
+            checksums, headers = manifest
+            self.checksums.update(checksums)
+            self.remote_headers.update(headers)
+            return
+
+        for obj in list_objects(self.s3.meta.client, bucket_name,
+                                max_workers=self.concurrency):
+            if obj['Key'] != MANIFEST_KEY:
                 self.checksums[obj['Key']] = obj['ETag']
 
     def create_bucket(self, bucket_name):
         """Creates new S3 bucket in given region"""
+        region_name = self.region_name or self.session.region_name
+
         try:
-            if self.session.region_name == 'us-east-1':
+            if region_name == 'us-east-1':
                 print('\nCreating S3 bucket {0}.\n'.format(bucket_name))
                 return self.s3.create_bucket(Bucket=bucket_name)
 
@@ -52,7 +159,7 @@ class S3Client:
             return self.s3.create_bucket(
                 Bucket=bucket_name,
                 CreateBucketConfiguration={
-                    'LocationConstraint': self.session.region_name
+                    'LocationConstraint': region_name
                 })
 
         except ClientError as err:
@@ -69,11 +176,19 @@ class S3Client:
         for bucket in self.s3.buckets.all():
             print('s3://' + bucket.name)
 
-    def print_objects(self, bucket_name):
+    def print_objects(self, bucket_name, prefix=''):
         """Lists all objects in the given bucket"""
+        objects = list_objects(
+            self.s3.meta.client,
+            bucket_name,
+            prefix=prefix,
+            max_workers=self.concurrency)
+
         try:
-            for obj in self.s3.Bucket(bucket_name).objects.all():
-                print(obj.key)
+            for batch in batched(objects, LISTING_BATCH_SIZE):
+                sys.stdout.write(''.join(obj['Key'] + '\n' for obj in batch
+                                         if obj['Key'] != MANIFEST_KEY))
+                sys.stdout.flush()
 
         except ClientError as err:
             print('Unable to list bucket: {0}. '.format(bucket_name) +
@@ -83,81 +198,716 @@ class S3Client:
         """Setup S3 bucket for website hosting"""
         try:
             bucket = self.create_bucket(bucket_name)
-            set_bucket_policy(bucket)
+            set_bucket_policy(bucket, get_account_id(self.profile_name))
             set_website_config(bucket)
             print('\nSuccess! URL: {0}'.format(
                 self.get_bucket_url(bucket_name)))
 
+            return True
+
         except ClientError:
             print('\nFailed to setup bucket: {0}. '.format(bucket_name))
 
-    def sync_to_bucket(self, path, bucket_name):
-        """Sync path recursively to the given bucket"""
-        self.load_checksums(bucket_name)
-        bucket = self.s3.Bucket(bucket_name)
-        root_path = Path(path).expanduser().resolve()
-
-        def recursive_upload(bucket, target_path):
-            """Uploads files recursively from root path to S3 bucket"""
-            for path in target_path.iterdir():
-                if path.is_dir():
-                    recursive_upload(bucket, path)
+    def regional_client(self, bucket_name):
+        """New client with the same settings in the bucket's region"""
+        region = get_bucket_region(self.s3.meta.client, bucket_name)
+        client = S3Client(self.concurrency,
+                          **dict(self.params, region_name=region))
+
+        # the bandwidth cap is shared by every bucket synced at once
+        client.bandwidth = self.bandwidth
+        return client
+
+    def sync_to_bucket(self,
+                       path,
+                       bucket_name,
+                       rehash=False,
+                       excludes=(),
+                       dry_run=False,
+                       output='summary',
+                       compression=None,
+                       headers_file=None,
+                       fingerprint=False,
+                       full_listing=False,
+                       stream=False):
+        """
+        Sync path recursively to the given bucket. With stream, the local
+        tree is walked in key order and merged with a paginated listing,
+        so memory stays flat however many objects there are; only
+        totals are kept in the plan and no manifest is written.
+        """
+        root_path = str(Path(path).expanduser().resolve())
+        rules = IgnoreRules.load(root_path, excludes)
 
-                if path.is_file():
-                    key = str(path.relative_to(root_path))
-                    path = str(path)
+        try:
+            header_rules = HeaderRules.load(root_path, headers_file)
 
-                    etag = self.upload_file(bucket, path, key)
+        except ValueError as err:
+            print('\nUnable to load header rules. ' + str(err) + '\n')
+            return
 
-                    self.new_checksums[key] = etag
+        try:
+            with ChecksumCache(rehash=rehash) as cache, KeySpool() as spool:
+                if stream:
+                    remote = {}
+                    plan = SyncPlan(remote, self.remote_headers, retain=False)
+
+                    def defer_delete(key, etag):
+                        """Deletes run after all uploads have finished"""
+                        plan.delete(key, etag)
+                        spool.add(key)
+
+                    items = merge_remote(
+                        walk_files(root_path, rules, ordered=True),
+                        iter_objects(self.s3.meta.client, bucket_name),
+                        remote, defer_delete)
+                else:
+                    self.load_checksums(bucket_name, full_listing)
+                    plan = SyncPlan(
+                        self.checksums,
+                        self.remote_headers,
+                        fingerprint=fingerprint)
+                    items = walk_files(root_path, rules)
+
+                files = local_files(items, cache, fingerprint, compression)
+                self.sync_files(path, bucket_name, files, cache, plan,
+                                header_rules, dry_run,
+                                spool if stream else None)
+
+            if dry_run:
+                print(plan.to_json() if output == 'json' else plan.summary())
+            elif not plan.failed:
+                print('\nSuccess!')
+
+            return plan
+
+        except (ClientError, BotoCoreError) as err:
+            print('\nUnable to sync path: {0} to bucket: {1}. '.format(
+                path, bucket_name) + str(err))
+
+    def sync_to_buckets(self,
+                        path,
+                        bucket_names,
+                        rehash=False,
+                        excludes=(),
+                        dry_run=False,
+                        output='summary',
+                        compression=None,
+                        headers_file=None,
+                        fingerprint=False,
+                        full_listing=False):
+        """
+        Sync path to several buckets, which may be in different regions.
+        The tree is walked and hashed once, then every bucket is diffed
+        and synced concurrently by a client in its own region. Returns
+        a mapping of bucket name to plan, or to None if its sync failed.
+        """
+        root_path = str(Path(path).expanduser().resolve())
+        rules = IgnoreRules.load(root_path, excludes)
 
         try:
-            print('\nBegin syncing {0} to bucket {1}...\n'.format(
-                path, bucket_name))
-            recursive_upload(bucket, root_path)
-            self.delete_objects(bucket)
+            header_rules = HeaderRules.load(root_path, headers_file)
+
+        except ValueError as err:
+            print('\nUnable to load header rules. ' + str(err) + '\n')
+            return {}
+
+        with ChecksumCache(rehash=rehash) as cache:
+            files = list(
+                local_files(
+                    walk_files(root_path, rules), cache, fingerprint,
+                    compression))
+
+            def sync(bucket_name):
+                """Diffs and syncs a single bucket on a worker thread"""
+                client = self.regional_client(bucket_name)
+
+                try:
+                    client.load_checksums(bucket_name, full_listing)
+                    plan = SyncPlan(
+                        client.checksums,
+                        client.remote_headers,
+                        fingerprint=fingerprint)
+                    client.sync_files(path, bucket_name, iter(files), cache,
+                                      plan, header_rules, dry_run)
+                    return bucket_name, plan
+
+                except (ClientError, BotoCoreError) as err:
+                    print('\nUnable to sync path: {0} to bucket: {1}. '.format(
+                        path, bucket_name) + str(err))
+                    return bucket_name, None
+
+            plans = dict(bounded_map(sync, bucket_names, len(bucket_names)))
+
+        if dry_run and output == 'json':
+            print(
+                json.dumps(
+                    {
+                        name: plan.to_dict()
+                        for name, plan in plans.items() if plan
+                    },
+                    indent=2))
+        elif dry_run:
+            for name in bucket_names:
+                if plans[name]:
+                    print('\n{0}:\n{1}'.format(name, plans[name].summary()))
+        elif all(plan and not plan.failed for plan in plans.values()):
             print('\nSuccess!')
 
-        except ClientError:
-            print('\nUnable to sync path: {0} to bucket: {1}. '.format(
-                path, bucket_name))
+        return plans
+
+    def sync_files(self,
+                   path,
+                   bucket_name,
+                   files,
+                   cache,
+                   plan,
+                   header_rules=None,
+                   dry_run=False,
+                   deletes=None):
+        """
+        Diff LocalFiles against the bucket with plan and sync them, or
+        only complete the plan on a dry run. deletes, if given, are the
+        keys to delete in place of those planned from the listing.
+        """
+        bucket = self.s3.Bucket(bucket_name)
+        files = match_part_sizes(files, plan.remote, cache)
+
+        if header_rules:
+            files = self.load_headers(
+                bucket, apply_headers(files, header_rules), plan.remote,
+                plan.failed)
+
+        actions = plan.plan_files(files)
+
+        if dry_run:
+            return plan.complete(actions)
+
+        print('\nBegin syncing {0} to bucket {1}...\n'.format(
+            path, bucket_name))
+        invalidate_manifest(self.s3.meta.client, bucket_name)
+
+        with SyncJournal() as journal:
+            self.journal = journal
+
+            # a plan given its deletes did not see the whole bucket, so
+            # only multipart uploads are journaled
+            if deletes is None:
+                journal.begin(bucket_name, plan.remote, plan.remote_headers)
+
+            try:
+                plan.failed.update(
+                    self.upload_files(bucket, actions, record=plan.retain))
+
+                # deleting objects that failed files may still refer to
+                # would leave the site inconsistent
+                if plan.failed:
+                    self.print_failures(bucket_name, plan.failed)
+                    return plan
+
+                undeleted = self.delete_objects(
+                    bucket, deletes if deletes is not None else
+                    (action.key for action in plan.plan_deletes()))
+
+                if deletes is None:
+                    # without a manifest, the next sync lists the bucket
+                    # and retries the deletes
+                    if not undeleted:
+                        write_manifest(self.s3.meta.client, bucket_name,
+                                       plan.manifest())
+
+                    self.abort_uploads(
+                        bucket,
+                        journal.finish(bucket_name) +
+                        self.stale_uploads(bucket))
+
+            finally:
+                self.journal = None
+
+        return plan
+
+    @staticmethod
+    def print_failures(bucket_name, failed):
+        """Prints the keys that could not be synced, and why"""
+        print('\nUnable to sync {0} files to bucket: {1}. '
+              'Stale objects were not deleted.'.format(
+                  len(failed), bucket_name))
+
+        for key in sorted(failed):
+            print('{0}: {1}'.format(key, failed[key]))
+
+    def watch_bucket(self,
+                     path,
+                     bucket_name,
+                     rehash=False,
+                     excludes=(),
+                     compression=None,
+                     headers_file=None,
+                     full_listing=False):
+        """
+        Sync path to the given bucket, then watch it and sync only the
+        keys that change. The bucket is never listed again; its state
+        is kept in memory and updated after every sync.
+        """
+        plan = self.sync_to_bucket(
+            path,
+            bucket_name,
+            rehash=rehash,
+            excludes=excludes,
+            compression=compression,
+            headers_file=headers_file,
+            full_listing=full_listing)
 
-    def upload_file(self, bucket, path, key):
+        if plan is None:
+            return
+
+        plan.apply()
+        root_path = str(Path(path).expanduser().resolve())
+        rules = IgnoreRules.load(root_path, excludes)
+        header_rules = HeaderRules.load(root_path, headers_file)
+        watcher = get_watcher(root_path, rules)
+
+        print('\nWatching {0} for changes. Press Ctrl+C to stop.'.format(path))
+
+        try:
+            with ChecksumCache() as cache:
+                for changed in watcher.changes():
+                    items = list(walk_keys(root_path, changed, rules))
+                    local_keys = {key for _, key, _ in items}
+                    prefixes = tuple(key + '/' for key in changed if key)
+                    deletes = [
+                        key for key in self.checksums
+                        if key not in local_keys and (
+                            key in changed or '' in changed or
+                            key.startswith(prefixes))
+                    ]
+
+                    plan = SyncPlan(self.checksums, self.remote_headers)
+
+                    for key in deletes:
+                        plan.delete(key, self.checksums[key])
+
+                    try:
+                        files = local_files(iter(items), cache,
+                                            compression=compression)
+                        self.sync_files(path, bucket_name, files, cache,
+                                        plan, header_rules, deletes=deletes)
+                        plan.apply()
+                        print('\n{0} uploaded, {1} copied, {2} updated, '
+                              '{3} deleted. Watching...'.format(
+                                  len(plan.uploads), len(plan.copies),
+                                  len(plan.updates), len(plan.deletes)))
+
+                    except (ClientError, BotoCoreError) as err:
+                        print('\nUnable to sync changes to bucket: {0}. '.format(
+                            bucket_name) + str(err) + '\nWatching...')
+
+        except KeyboardInterrupt:
+            print('\nStopped watching {0}.'.format(path))
+
+    def load_headers(self, bucket, files, remote=None, failed=None):
+        """
+        Fetch current headers of objects whose content is unchanged.
+        Objects gone since the listing are uploaded again. Files whose
+        headers cannot be read are left out and added to failed, so the
+        sync reports them and deletes nothing.
+        """
+        remote = self.checksums if remote is None else remote
+        failed = {} if failed is None else failed
+
+        def head(file):
+            """Reads a single object's headers on a worker thread"""
+            if remote.get(file.key) != file.etag or \
+            file.key in self.remote_headers:
+                return file, None, None
+
+            try:
+                response = self.s3.meta.client.head_object(
+                    Bucket=bucket.name, Key=file.key)
+                return file, object_headers(response), None
+
+            except TRANSFER_ERRORS as err:
+                if error_code(err) in ('404', 'NoSuchKey'):
+                    remote.pop(file.key, None)
+                    return file, None, None
+
+                return file, None, err
+
+        for file, headers, err in bounded_map(head, files, self.concurrency):
+            if err is not None:
+                print('Unable to read headers of {0} in {1}. '.format(
+                    file.key, bucket.name) + str(err))
+                failed[file.key] = str(err)
+                continue
+
+            if headers is not None:
+                self.remote_headers[file.key] = headers
+
+            yield file
+
+    def upload_files(self, bucket, actions, record=True):
+        """
+        Executes planned upload, copy, update and skip actions. Unless
+        record is False, the resulting ETags are kept in new_checksums.
+        A failed file does not stop the others; it is retried if the
+        error may pass. Returns a mapping of failed keys to errors.
+        """
+        copies = []
+        queue = RetryQueue()
+
+        def done(action, etag):
+            """Journals a finished action so a rerun can skip it"""
+            if self.journal:
+                self.journal.record(bucket.name, action.key, etag,
+                                    action.headers)
+
+            return etag
+
+        def upload(action):
+            """Uploads a single planned file on a worker thread"""
+            if action.action == UPDATE:
+                return done(
+                    action,
+                    self.update_headers(bucket, action.key, action.etag,
+                                        action.size, action.encoding,
+                                        action.headers))
+
+            return done(
+                action,
+                self.upload_file(bucket, action.path, action.key,
+                                 action.etag, action.encoding,
+                                 action.headers))
+
+        def attempt(run):
+            """Wraps run to return (action, etag, error) instead of raising"""
+
+            def wrapped(action):
+                try:
+                    return action, run(action), None
+
+                except TRANSFER_ERRORS as err:
+                    return action, None, err
+
+            return wrapped
+
+        def gather(results):
+            """Records results and queues failures, on this thread only"""
+            for action, etag, err in results:
+                if err is not None:
+                    queue.add(action, err)
+                elif record:
+                    self.new_checksums[action.key] = etag
+
+        def uploads():
+            """Records skips, holds back copies and yields the rest"""
+            for action in actions:
+                if action.action == SKIP:
+                    print('Skipping {0}... checksums match'.format(action.key))
+
+                    if record:
+                        self.new_checksums[action.key] = action.etag
+                elif action.action == COPY:
+                    copies.append(action)
+                else:
+                    yield action
+
+        # hashing runs on a process pool and feeds the upload pool as
+        # results complete. results are gathered on this thread only,
+        # so new_checksums needs no locking
+        gather(bounded_map(attempt(upload), uploads(), self.concurrency))
+
+        # copies run once uploads are done, so no source is read while
+        # it is being replaced. a source that was itself overwritten in
+        # this run, or is a copy target, falls back to a normal upload
+        targets = {action.key for action in copies}
+        sources = {
+            action.key: action.source
+            for action in copies if action.source not in targets and
+            action.source not in queue.attempts and
+            self.new_checksums.get(action.source, self.checksums.get(
+                action.source)) == action.etag
+        }
+
+        def copy(action):
+            """Copies a single planned file on a worker thread"""
+            if action.key not in sources:
+                return upload(action)
+
+            return done(
+                action,
+                self.copy_file(bucket, sources[action.key], action.key,
+                               action.etag, action.size, action.encoding,
+                               action.headers))
+
+        gather(bounded_map(attempt(copy), copies, self.concurrency))
+
+        # copies are retried as uploads, since their sources may be
+        # retried in the same round
+        for retries in queue.rounds():
+            print('\nRetrying {0} failed files...\n'.format(len(retries)))
+            gather(bounded_map(attempt(upload), retries, self.concurrency))
+
+        return queue.failed
+
+    def upload_file(self,
+                    bucket,
+                    path,
+                    key,
+                    checksum=None,
+                    encoding=None,
+                    headers=None):
         """Uploads file to S3 bucket"""
         content_type = mimetypes.guess_type(key)[0] or 'text/plain'
-        checksum = generate_checksum(path)
+        checksum = checksum or generate_checksum(path)
+        extra_args = dict(headers or {'ContentType': content_type})
 
-        if self.checksums.get(key, '') == checksum:
-            print('Skipping {0}... checksums match'.format(key))
-            return checksum
+        if encoding:
+            extra_args['ContentEncoding'] = encoding
+
+        size = os.path.getsize(path)
 
         try:
             print('Uploading {0} to {1} (content-type: {2}).'.format(
-                key, bucket.name, content_type))
-            bucket.upload_file(
-                path,
-                key,
-                ExtraArgs={'ContentType': content_type},
-                Config=self.transfer_config)
+                key, bucket.name, extra_args['ContentType']))
+
+            if self.journal and size > choose_part_size(size):
+                self.upload_parts(bucket, path, key, checksum, size,
+                                  extra_args)
+            else:
+                self.limiter.call(
+                    self.transfers.upload_file,
+                    path,
+                    bucket.name,
+                    key,
+                    ExtraArgs=extra_args,
+                    Callback=self.bandwidth.consume
+                    if self.bandwidth else None,
+                    Config=self.get_transfer_config(size))
 
             return checksum
 
-        except ClientError as err:
+        except (ClientError, S3UploadFailedError) as err:
             print('Unable to upload file: {0} to {1}. '.format(
                 path, bucket.name) + str(err))
             raise err
 
-    def delete_objects(self, bucket):
-        """Deletes obsolete objects in bucket based on checksum"""
+    def upload_parts(self, bucket, path, key, checksum, size, extra_args):
+        """
+        Uploads a file in parts of the size generate_checksum assumes.
+        The upload ID and every completed part are journaled, so an
+        upload cut short by a failed sync resumes at the missing parts.
+        """
+        client = self.transfers
+        part_size = choose_part_size(size)
+        config = self.get_transfer_config(size)
+        upload = self.journal.find_upload(bucket.name, key)
+
+        # the file changed since, so its parts are of no use
+        if upload and (upload.etag, upload.part_size) != (checksum,
+                                                          part_size):
+            self.abort_uploads(bucket, [(key, upload.upload_id)])
+            self.journal.end_upload(bucket.name, key, upload.upload_id)
+            upload = None
+
+        count = -(-size // part_size)
+        callbacks = [self.bandwidth.consume] if self.bandwidth else None
+
+        if upload:
+            print('Resuming upload of {0} with {1} of {2} parts done.'.format(
+                key, len(upload.parts), count))
+            upload_id, parts = upload.upload_id, dict(upload.parts)
+        else:
+            upload_id = self.limiter.call(
+                client.create_multipart_upload,
+                Bucket=bucket.name,
+                Key=key,
+                **extra_args)['UploadId']
+            self.journal.start_upload(bucket.name, key, upload_id, checksum,
+                                      part_size)
+            parts = {}
+
+        def send(number):
+            """Uploads a single part on a worker thread"""
+            with ReadFileChunk.from_filename(path, (number - 1) * part_size,
+                                             part_size, callbacks) as body:
+                etag = client.upload_part(
+                    Bucket=bucket.name,
+                    Key=key,
+                    UploadId=upload_id,
+                    PartNumber=number,
+                    Body=body)['ETag']
+
+            self.journal.add_part(upload_id, number, etag)
+            return number, etag
+
+        missing = [n for n in range(1, count + 1) if n not in parts]
+
         try:
-            for obj in bucket.objects.all():
-                key = obj.key
+            for number, etag in bounded_map(
+                    partial(self.limiter.call, send), missing,
+                    config.max_concurrency):
+                parts[number] = etag
+
+            self.limiter.call(
+                client.complete_multipart_upload,
+                Bucket=bucket.name,
+                Key=key,
+                UploadId=upload_id,
+                MultipartUpload={
+                    'Parts': [{
+                        'ETag': parts[number],
+                        'PartNumber': number
+                    } for number in sorted(parts)]
+                })
 
-                if self.checksums.get(
-                        key, '') and not self.new_checksums.get(key, ''):
-                    print('Deleting {0} from {1}.'.format(key, bucket.name))
-                    obj.delete()
+        except ClientError as err:
+            # the upload was aborted after it was journaled, start over
+            if upload and error_code(err) == 'NoSuchUpload':
+                self.journal.end_upload(bucket.name, key, upload_id)
+                return self.upload_parts(bucket, path, key, checksum, size,
+                                         extra_args)
+
+            raise err
+
+        self.journal.end_upload(bucket.name, key, upload_id)
+
+    def stale_uploads(self, bucket):
+        """(key, upload_id) of uploads older than MULTIPART_MAX_AGE"""
+        paginator = self.s3.meta.client.get_paginator('list_multipart_uploads')
+        cutoff = time.time() - MULTIPART_MAX_AGE
+        uploads = []
+
+        try:
+            for page in paginator.paginate(Bucket=bucket.name):
+                uploads.extend(
+                    (upload['Key'], upload['UploadId'])
+                    for upload in page.get('Uploads', [])
+                    if upload['Initiated'].timestamp() < cutoff)
 
         except ClientError as err:
-            print('Unable to delete object in {0}. '.format(bucket.name) +
-                  str(err) + '\n')
+            print('Unable to list multipart uploads in {0}. '.format(
+                bucket.name) + str(err) + '\n')
+
+        return uploads
+
+    def abort_uploads(self, bucket, uploads):
+        """
+        Aborts abandoned multipart uploads, given as (key, upload_id),
+        since their parts are stored and billed until they are aborted
+        """
+        for key, upload_id in set(uploads):
+            try:
+                print('Aborting abandoned upload of {0} to {1}.'.format(
+                    key, bucket.name))
+                self.s3.meta.client.abort_multipart_upload(
+                    Bucket=bucket.name, Key=key, UploadId=upload_id)
+
+            except ClientError as err:
+                if error_code(err) != 'NoSuchUpload':
+                    print('Unable to abort upload of {0} to {1}. '.format(
+                        key, bucket.name) + str(err))
+
+    def copy_file(self, bucket, source, key, checksum, size, encoding,
+                  headers):
+        """Copies content the bucket already holds to key server-side"""
+        content_type = mimetypes.guess_type(key)[0] or 'text/plain'
+        extra_args = dict(
+            headers or {'ContentType': content_type},
+            MetadataDirective='REPLACE')
+
+        if encoding:
+            extra_args['ContentEncoding'] = encoding
+
+        try:
+            print('Copying {0} to {1} in {2}.'.format(source, key,
+                                                      bucket.name))
+            copy_source = {'Bucket': bucket.name, 'Key': source}
+            self.limiter.call(
+                self.transfers.copy,
+                copy_source,
+                bucket.name,
+                key,
+                ExtraArgs=extra_args,
+                Config=self.get_transfer_config(size))
+
+            return checksum
+
+        except ClientError as err:
+            print('Unable to copy {0} to {1} in {2}. '.format(
+                source, key, bucket.name) + str(err))
+            raise err
+
+    def update_headers(self, bucket, key, checksum, size, encoding, headers):
+        """Replaces headers of an object in place with a server-side copy"""
+        extra_args = dict(headers, MetadataDirective='REPLACE')
+
+        if encoding:
+            extra_args['ContentEncoding'] = encoding
+
+        try:
+            print('Updating headers of {0} in {1}.'.format(key, bucket.name))
+            copy_source = {'Bucket': bucket.name, 'Key': key}
+            self.limiter.call(
+                self.transfers.copy,
+                copy_source,
+                bucket.name,
+                key,
+                ExtraArgs=extra_args,
+                Config=self.get_transfer_config(size))
+
+            return checksum
+
+        except ClientError as err:
+            print('Unable to update headers of {0} in {1}. '.format(
+                key, bucket.name) + str(err))
+            raise err
+
+    def delete_objects(self, bucket, keys=None):
+        """
+        Deletes keys, by default objects that were not synced.
+        Returns the keys that could not be deleted.
+        """
+        stale_keys = keys if keys is not None else (
+            key for key in self.checksums if key not in self.new_checksums)
+
+        def delete_batch(keys):
+            """Deletes up to DELETE_BATCH_SIZE keys in one request"""
+            for key in keys:
+                print('Deleting {0} from {1}.'.format(key, bucket.name))
+
+            try:
+                response = self.limiter.call(
+                    self.transfers.delete_objects,
+                    Bucket=bucket.name,
+                    Delete={
+                        'Objects': [{
+                            'Key': key
+                        } for key in keys],
+                        'Quiet': True
+                    })
+
+            except TRANSFER_ERRORS as err:
+                print('Unable to delete objects in {0}. '.format(bucket.name)
+                      + str(err) + '\n')
+                return keys
+
+            failed = []
+
+            for error in response.get('Errors', []):
+                print('Unable to delete {0} from {1}. {2}: {3}'.format(
+                    error['Key'], bucket.name, error['Code'],
+                    error['Message']))
+                failed.append(error['Key'])
+
+            if self.journal:
+                self.journal.forget(
+                    bucket.name, (key for key in keys if key not in failed))
+
+            return failed
+
+        batches = batched(stale_keys, DELETE_BATCH_SIZE)
+        return [
+            key for failed in bounded_map(delete_batch, batches,
+                                          self.concurrency)
+            for key in failed
+        ]
@@ -1,4 +1,39 @@
 """Constants for PyJam"""
 
+import os
+
 VERSION = '0.3.2'
 CHUNK_SIZE = 8388608
+MAX_CHUNK_SIZE = 5368709120
+TARGET_PARTS = 100
+MAX_CONCURRENCY = 10
+PART_CONCURRENCY = 4
+CLIENT_MAX_RETRIES = 5
+CONNECT_TIMEOUT = 10
+INLINE_HASH_SIZE = 1048576
+DELETE_BATCH_SIZE = 1000
+COMPRESS_MIN_SIZE = 1024
+INVALIDATION_MAX_PATHS = 3000
+INVALIDATION_MAX_WILDCARDS = 15
+LISTING_MAX_DEPTH = 3
+LISTING_BATCH_SIZE = 1000
+METADATA_PREFIX = '.pyjam/'
+MANIFEST_KEY = METADATA_PREFIX + 'manifest.json.gz'
+MANIFEST_MAX_AGE = 604800
+MULTIPART_MAX_AGE = 86400
+CACHE_DIR = os.path.join(os.environ.get('XDG_CACHE_HOME', '~/.cache'), 'pyjam')
+CACHE_VERSION = 2
+CACHE_BATCH_SIZE = 500
+CACHE_TIMEOUT = 30
+WATCH_INTERVAL = 1.0
+WATCH_DEBOUNCE = 0.5
+THROTTLE_RETRIES = 8
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 20.0
+RETRY_ATTEMPTS = 3
+POLL_INITIAL = 2.0
+POLL_MAX_DELAY = 30.0
+CERTIFICATE_READY_TIMEOUT = 120
+VALIDATION_TIMEOUT = 2400
+DEPLOY_TIMEOUT = 2400
+INVALIDATION_TIMEOUT = 900
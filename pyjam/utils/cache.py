@@ -0,0 +1,131 @@
+"""Persistent local cache of file checksums keyed on file stat"""
+
+import os
+import sqlite3
+import threading
+import time
+from pyjam.constants import CACHE_DIR, CACHE_VERSION, CACHE_BATCH_SIZE
+from pyjam.utils.checksum import choose_part_size, generate_checksum
+from pyjam.utils.database import connect
+
+# mtimes closer than this to the time of hashing are not trusted,
+# since a write in the same timestamp tick would go unnoticed
+RACY_WINDOW_NS = 2 * 10**9
+
+CACHE_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS checksums (
+        path TEXT NOT NULL,
+        part_size INTEGER NOT NULL,
+        size INTEGER NOT NULL,
+        mtime_ns INTEGER NOT NULL,
+        inode INTEGER NOT NULL,
+        etag TEXT NOT NULL,
+        PRIMARY KEY (path, part_size)
+    );'''
+
+
+class ChecksumCache:
+    """
+    SQLite backed manifest of path, size, mtime and inode to S3 ETag.
+    ETags are stored per multipart part size, since the part size
+    changes the ETag of multipart files. New entries are committed in
+    batches, and a cache that cannot be read or written, e.g. while
+    another sync holds it locked, only costs cache misses.
+    """
+
+    def __init__(self, path=None, rehash=False):
+        """Open (or create) the cache database"""
+        self.rehash = rehash
+        self.lock = threading.Lock()
+        self.pending = []
+        self.warned = False
+        self.db = connect(
+            path or os.path.join(
+                os.path.expanduser(CACHE_DIR), 'checksums.db'),
+            'checksum cache', CACHE_VERSION, ('checksums',), CACHE_SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def lookup(self, path, stat=None, part_size=None):
+        """
+        Return (stat_key, etag) for path. etag is None when the file
+        has changed since it was last hashed (or rehash is set).
+        part_size defaults to the size chosen for the file.
+        """
+        stat = stat or os.stat(path)
+        stat_key = (stat.st_size, stat.st_mtime_ns, stat.st_ino)
+        part_size = part_size or choose_part_size(stat.st_size)
+
+        if self.rehash:
+            return stat_key, None
+
+        try:
+            with self.lock:
+                row = self.db.execute(
+                    'SELECT size, mtime_ns, inode, etag FROM checksums '
+                    'WHERE path = ? AND part_size = ?',
+                    (os.path.abspath(path), part_size)).fetchone()
+
+        except sqlite3.Error as err:
+            self._warn(err)
+            return stat_key, None
+
+        if row and tuple(row[:3]) == stat_key:
+            return stat_key, row[3]
+
+        return stat_key, None
+
+    def store(self, path, stat_key, etag, part_size=None):
+        """Record the etag computed for path at stat_key"""
+        size, mtime_ns, _ = stat_key
+        part_size = part_size or choose_part_size(size)
+
+        if int(time.time() * 10**9) - mtime_ns <= RACY_WINDOW_NS:
+            return
+
+        with self.lock:
+            self.pending.append((os.path.abspath(path), part_size) +
+                                tuple(stat_key) + (etag, ))
+
+            if len(self.pending) >= CACHE_BATCH_SIZE:
+                self._flush()
+
+    def _flush(self):
+        """Commit pending entries. The caller must hold the lock"""
+        pending, self.pending = self.pending, []
+
+        try:
+            with self.db:
+                self.db.executemany(
+                    'INSERT OR REPLACE INTO checksums '
+                    'VALUES (?, ?, ?, ?, ?, ?)', pending)
+
+        except sqlite3.Error as err:
+            self._warn(err)
+
+    def _warn(self, err):
+        """Report the first error reading or writing the cache"""
+        if not self.warned:
+            self.warned = True
+            print('Unable to use checksum cache, files may be rehashed. ' +
+                  str(err) + '\n')
+
+    def checksum(self, path, part_size=None):
+        """Return the ETag for path, hashing only if the file changed"""
+        stat_key, etag = self.lookup(path, part_size=part_size)
+
+        if etag is None:
+            etag = generate_checksum(path, part_size)
+            self.store(path, stat_key, etag, part_size)
+
+        return etag
+
+    def close(self):
+        """Commit pending entries and close the database"""
+        with self.lock:
+            self._flush()
+            self.db.close()
@@ -1,37 +1,121 @@
 """Utilities for generating checksums for S3 objects"""
 
+import os
+import threading
 from hashlib import md5
-from functools import reduce
-from pyjam.constants import CHUNK_SIZE
+from pyjam.constants import CHUNK_SIZE, MAX_CHUNK_SIZE, TARGET_PARTS
 
+# one read buffer per thread (and so per hashing process), reused for
+# every part of every file instead of allocating a new bytes per read
+_buffers = threading.local()
 
-def hash_data(data):
-    """Generate md5 hash for data."""
-    data_hash = md5()
-    data_hash.update(data)
 
-    return data_hash
+def part_size_series():
+    """Part sizes pyjam uses: CHUNK_SIZE doubling up to MAX_CHUNK_SIZE"""
+    part_size = CHUNK_SIZE
 
+    while part_size < MAX_CHUNK_SIZE:
+        yield part_size
+        part_size *= 2
 
-def generate_checksum(path):
-    """Generate checksum (S3 ETag) for file based on path"""
-    hashes = []
+    yield MAX_CHUNK_SIZE
+
+
+def choose_part_size(size):
+    """
+    Multipart part size for a file of size bytes: the smallest in the
+    series that fits the file in TARGET_PARTS parts, so multi-GB files
+    are sent in fewer, bigger parts (64 MiB for 4 GiB). Even a 5 TiB
+    object stays well under S3's 10,000 part limit.
+    """
+    for part_size in part_size_series():
+        if -(-size // part_size) <= TARGET_PARTS:
+            return part_size
+
+    return MAX_CHUNK_SIZE
+
+
+def candidate_part_sizes(size, parts):
+    """Part sizes from the series that split size bytes into parts"""
+    return [
+        part_size for part_size in part_size_series()
+        if max(1, -(-size // part_size)) == parts
+    ]
+
+
+def etag_parts(etag):
+    """Number of parts recorded in an S3 ETag (1 for single uploads)"""
+    _, _, parts = etag.strip('"').partition('-')
+    return int(parts) if parts.isdigit() else 1
+
+
+def get_buffer(size):
+    """Get this thread's reusable read buffer of at least size bytes"""
+    buffer = getattr(_buffers, 'buffer', None)
+
+    if buffer is None or len(buffer) < size:
+        buffer = _buffers.buffer = bytearray(size)
+
+    return memoryview(buffer)[:size]
+
+
+def read_part(file, view):
+    """Fill view from file, returning the number of bytes read"""
+    total = 0
+
+    while total < len(view):
+        count = file.readinto(view[total:])
+
+        if not count:
+            break
+
+        total += count
+
+    return total
+
+
+def generate_checksum(path, chunk_size=None):
+    """
+    Generate checksum (S3 ETag) for file based on path. chunk_size is
+    the multipart part size, by default chosen from the file's size.
+    """
+    digests = md5()
+    last_hash = None
+    parts = 0
+
+    with open(path, 'rb', buffering=0) as file:
+        chunk_size = chunk_size or choose_part_size(
+            os.fstat(file.fileno()).st_size)
+        view = get_buffer(min(chunk_size, CHUNK_SIZE))
 
-    with open(path, 'rb') as file:
         while True:
-            data = file.read(CHUNK_SIZE)
+            part_hash = md5()
+            remaining = chunk_size
+
+            # parts larger than the buffer are hashed a buffer at a time
+            while remaining:
+                size = read_part(file, view[:min(remaining, len(view))])
+
+                if not size:
+                    break
 
-            if not data:
+                part_hash.update(view[:size])
+                remaining -= size
+
+            if remaining == chunk_size:
                 break
 
-            hashes.append(hash_data(data))
+            digests.update(part_hash.digest())
+            last_hash = part_hash
+            parts += 1
+
+            if remaining:
+                break
 
-    if not hashes:
+    if not parts:
         return '""'
 
-    if len(hashes) == 1:
-        return '"{0}"'.format(hashes[0].hexdigest())
+    if parts == 1:
+        return '"{0}"'.format(last_hash.hexdigest())
 
-    digests = (h.digest() for h in hashes)
-    data_hash = hash_data(reduce(lambda x, y: x + y, digests))
-    return '"{0}-{1}"'.format(data_hash.hexdigest(), len(hashes))
+    return '"{0}-{1}"'.format(digests.hexdigest(), parts)
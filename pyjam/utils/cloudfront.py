@@ -0,0 +1,91 @@
+"""Utilities for CloudFront"""
+
+from collections import Counter
+from urllib.parse import quote
+from pyjam.constants import INVALIDATION_MAX_PATHS, INVALIDATION_MAX_WILDCARDS
+
+
+def find_distribution(client, domain_name):
+    """Find a CloudFront distribution with matching alias"""
+    paginator = client.get_paginator('list_distributions')
+    for page in paginator.paginate():
+        for distribution in page['DistributionList'].get('Items', []):
+            if domain_name in distribution['Aliases'].get('Items', []):
+                return distribution
+
+    return None
+
+
+def key_paths(key):
+    """
+    Viewer paths serving an object key. Index documents are also
+    served at their directory, e.g. docs/index.html at /docs/.
+    """
+    paths = ['/' + key]
+
+    if key == 'index.html' or key.endswith('/index.html'):
+        paths.append('/' + key[:-len('index.html')])
+
+    return paths
+
+
+def prefixes(key):
+    """Directory prefixes of key, e.g. a/b/c -> a/, a/b/"""
+    parts = key.split('/')[:-1]
+    return ['/'.join(parts[:i]) + '/' for i in range(1, len(parts) + 1)]
+
+
+def invalidation_paths(changed,
+                       all_keys,
+                       max_paths=INVALIDATION_MAX_PATHS,
+                       max_wildcards=INVALIDATION_MAX_WILDCARDS):
+    """
+    Collapse changed keys into the fewest invalidation paths.
+    Directories whose every key (in all_keys) changed become a single
+    wildcard. If the result is still over CloudFront's limits, the
+    directories covering the most changed keys are wildcarded until it
+    fits, falling back to /* as a last resort.
+    """
+    changed = set(changed)
+
+    if not changed:
+        return []
+
+    totals = Counter(p for key in set(all_keys) | changed
+                     for p in prefixes(key))
+    changes = Counter(p for key in changed for p in prefixes(key))
+
+    def covered(prefix):
+        return {key for key in changed if key.startswith(prefix)}
+
+    def count(wildcards, keys):
+        return len(wildcards) + sum(len(key_paths(key)) for key in keys)
+
+    # exact wildcards, topmost first, only where they replace 2+ paths
+    full = sorted((p for p in changes if changes[p] == totals[p]
+                   and changes[p] > 1), key=len)
+    wildcards = []
+    for prefix in full:
+        if not any(prefix.startswith(w) for w in wildcards):
+            wildcards.append(prefix)
+
+    wildcards = sorted(wildcards, key=lambda p: -changes[p])[:max_wildcards]
+    remaining = changed - {k for w in wildcards for k in covered(w)}
+
+    # lossy wildcards while the individual paths don't fit
+    while count(wildcards, remaining) > max_paths:
+        counts = Counter(p for key in remaining for p in prefixes(key))
+
+        if not counts or len(wildcards) >= max_wildcards:
+            return ['/*']
+
+        prefix = max(counts, key=lambda p: (counts[p], len(p)))
+        wildcards = [w for w in wildcards if not w.startswith(prefix)]
+        wildcards.append(prefix)
+        remaining -= covered(prefix)
+
+    paths = [quote('/' + w, safe='/') + '*' for w in sorted(wildcards)]
+    paths += sorted(quote(p, safe='/') for key in remaining
+                    for p in key_paths(key))
+
+    return paths
@@ -0,0 +1,68 @@
+"""Utilities for pre-compressing text assets"""
+
+import gzip
+import mimetypes
+import os
+import shutil
+import tempfile
+from collections import namedtuple
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+Compression = namedtuple('Compression', ['encoding', 'level', 'min_size'])
+
+EXTENSIONS = {'gzip': '.gz', 'br': '.br'}
+DEFAULT_LEVELS = {'gzip': 9, 'br': 11}
+LEVEL_RANGES = {'gzip': (1, 9), 'br': (0, 11)}
+TEXT_TYPES = {
+    'application/javascript',
+    'application/json',
+    'application/manifest+json',
+    'application/xml',
+    'application/xhtml+xml',
+    'image/svg+xml',
+    'image/x-icon',
+}
+
+
+def brotli_available():
+    """Return True if the optional brotli package is installed"""
+    return brotli is not None
+
+
+def is_compressible(key):
+    """Return True if key looks like a text-like asset"""
+    content_type = mimetypes.guess_type(key)[0] or 'text/plain'
+    return content_type.startswith('text/') or content_type in TEXT_TYPES
+
+
+def compress_file(path, dest, encoding, level):
+    """
+    Compress path into dest. Output is deterministic (no gzip name or
+    mtime) so identical sources always produce identical ETags.
+    """
+    directory = os.path.dirname(dest)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory)
+
+    try:
+        with open(path, 'rb') as source, os.fdopen(fd, 'wb') as target:
+            if encoding == 'br':
+                target.write(brotli.compress(source.read(), quality=level))
+            else:
+                with gzip.GzipFile(
+                        filename='',
+                        mode='wb',
+                        compresslevel=level,
+                        fileobj=target,
+                        mtime=0) as archive:
+                    shutil.copyfileobj(source, archive)
+
+        os.replace(tmp_path, dest)
+
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
@@ -0,0 +1,40 @@
+"""Utilities for the SQLite databases kept in the cache dir"""
+
+import os
+import sqlite3
+from pyjam.constants import CACHE_TIMEOUT
+
+
+def prepare(db, version, tables, schema):
+    """
+    Drop tables if the database is of another version, then run schema,
+    a script of CREATE TABLE IF NOT EXISTS statements.
+    """
+    if db.execute('PRAGMA user_version').fetchone()[0] != version:
+        for table in tables:
+            db.execute('DROP TABLE IF EXISTS {0}'.format(table))
+        db.execute('PRAGMA user_version = {0:d}'.format(version))
+
+    db.executescript('PRAGMA synchronous = NORMAL;' + schema)
+    return db
+
+
+def connect(path, name, version, tables, schema):
+    """
+    Connect to the database at path in WAL mode, so several syncs can
+    share it, and prepare its tables. Falls back to an in-memory
+    database if it cannot be opened, e.g. while another sync holds it
+    locked for longer than CACHE_TIMEOUT.
+    """
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        db = sqlite3.connect(
+            path, timeout=CACHE_TIMEOUT, check_same_thread=False)
+        db.execute('PRAGMA journal_mode = WAL')
+        return prepare(db, version, tables, schema)
+
+    except (OSError, sqlite3.Error) as err:
+        print('Unable to open {0} {1}. '.format(name, path) + str(err) + '\n')
+        return prepare(
+            sqlite3.connect(':memory:', check_same_thread=False), version,
+            tables, schema)
@@ -0,0 +1,132 @@
+"""Utilities for running deploy steps as a dependency graph"""
+
+import json
+import os
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from pyjam.constants import CACHE_DIR
+
+PENDING, RUNNING, DONE, FAILED, SKIPPED = \
+'pending', 'running', 'done', 'failed', 'skipped'
+
+# run returns a truthy value when the step succeeded
+Step = namedtuple('Step', ['name', 'run', 'requires'])
+
+
+def format_duration(seconds):
+    """Format seconds as e.g. 4m 05s"""
+    minutes, seconds = divmod(int(seconds), 60)
+    return '{0}m {1:02d}s'.format(minutes, seconds) if minutes \
+    else '{0}s'.format(seconds)
+
+
+class DeployState:
+    """Names of the completed steps of a deploy, kept in the cache dir"""
+
+    def __init__(self, name, path=None):
+        """Load the state of the deploy called name"""
+        self.path = path or os.path.join(
+            os.path.expanduser(CACHE_DIR), 'deploy', name + '.json')
+        self.completed = set()
+
+        try:
+            with open(self.path) as file:
+                self.completed = set(json.load(file).get('completed', []))
+
+        except (OSError, ValueError):
+            pass
+
+    def add(self, step_name):
+        """Record that step_name completed"""
+        self.completed.add(step_name)
+
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+
+            with open(self.path, 'w') as file:
+                json.dump({'completed': sorted(self.completed)}, file)
+
+        except OSError as err:
+            print('Unable to save deploy state {0}. '.format(self.path) +
+                  str(err) + '\n')
+
+    def clear(self):
+        """Forget the completed steps, so the next deploy runs them all"""
+        self.completed = set()
+
+        try:
+            os.remove(self.path)
+
+        except FileNotFoundError:
+            pass
+
+
+def run_steps(steps, completed=(), on_done=None):
+    """
+    Run each step on its own thread as soon as the steps it requires are
+    done, skipping steps in completed and those whose requirements
+    failed. on_done is called with the name of each step that succeeds.
+    Returns a dict of step name to status.
+    """
+    status = {
+        step.name: DONE if step.name in completed else PENDING
+        for step in steps
+    }
+    started = {}
+    running = {}
+
+    def report(step_name, message=''):
+        """Print a status change"""
+        print('\n[{0}] {1}{2}'.format(step_name, status[step_name], message))
+
+    with ThreadPoolExecutor(max_workers=max(1, len(steps))) as executor:
+        while True:
+            changed = True
+
+            # repeat until skips have propagated down the graph
+            while changed:
+                changed = False
+
+                for step in steps:
+                    if status[step.name] != PENDING:
+                        continue
+
+                    requires = [status[name] for name in step.requires]
+
+                    if FAILED in requires or SKIPPED in requires:
+                        status[step.name] = SKIPPED
+                        changed = True
+                        report(step.name)
+
+                    elif all(state == DONE for state in requires):
+                        status[step.name] = RUNNING
+                        started[step.name] = time.monotonic()
+                        running[executor.submit(step.run)] = step
+                        report(step.name)
+
+            if not running:
+                return status
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+
+            for future in finished:
+                step = running.pop(future)
+
+                try:
+                    success = future.result()
+
+                # any error fails only this step, so the steps running
+                # alongside it finish and the status is still reported
+                except Exception as err:
+                    print('Step {0} failed. {1}: {2}\n'.format(
+                        step.name,
+                        type(err).__name__, err))
+                    success = False
+
+                status[step.name] = DONE if success else FAILED
+                report(step.name, ' in {0}'.format(
+                    format_duration(time.monotonic() - started[step.name])))
+
+                if success and on_done:
+                    on_done(step.name)
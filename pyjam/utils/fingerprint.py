@@ -0,0 +1,128 @@
+"""Utilities for content-hash fingerprinting of static assets"""
+
+import posixpath
+import re
+
+HASH_LENGTH = 10
+
+FINGERPRINT_EXTENSIONS = {
+    '.css', '.js', '.png', '.jpg', '.jpeg', '.gif', '.svg', '.webp',
+    '.avif', '.woff', '.woff2', '.ttf', '.otf', '.eot'
+}
+REWRITE_EXTENSIONS = {'.html', '.htm', '.css'}
+
+HTML_REFERENCES = re.compile(
+    r'''((?:src|href|poster|content)\s*=\s*)(["'])(.*?)\2''', re.IGNORECASE)
+SRCSET_REFERENCES = re.compile(r'''(srcset\s*=\s*)(["'])(.*?)\2''',
+                               re.IGNORECASE)
+# @import url(...) is tried first, so its url is not taken for a bare
+# @import target
+CSS_REFERENCES = re.compile(
+    r'''(@import\s+url\(\s*|url\(\s*|@import\s+)(["']?)([^"')\s]+)\2''',
+    re.IGNORECASE)
+FINGERPRINTED_KEY = re.compile(r'^(.*)\.[0-9a-f]{%d}(\.[^./]+)$' % HASH_LENGTH)
+
+
+def extension(key):
+    """Lower cased extension of key"""
+    return posixpath.splitext(key)[1].lower()
+
+
+def should_fingerprint(key):
+    """Return True if key is an asset that gets a hashed name"""
+    return extension(key) in FINGERPRINT_EXTENSIONS
+
+
+def should_rewrite(key):
+    """Return True if key may reference other assets"""
+    return extension(key) in REWRITE_EXTENSIONS
+
+
+def fingerprint_key(key, etag):
+    """Insert a hash of the ETag into key, e.g. style.<hash>.css"""
+    root, ext = posixpath.splitext(key)
+    digest = etag.strip('"').split('-')[0][:HASH_LENGTH]
+    return '{0}.{1}{2}'.format(root, digest, ext)
+
+
+def fingerprint_origin(key):
+    """Key that a fingerprinted key was named after, or None"""
+    match = FINGERPRINTED_KEY.match(key)
+    return match.group(1) + match.group(2) if match else None
+
+
+def reference_target(url, key):
+    """Key that a reference made from key points to, or None if external"""
+    if not url or url.startswith(('#', 'data:', 'mailto:', '//')) or \
+    re.match(r'^[a-z][a-z0-9+.-]*:', url, re.IGNORECASE):
+        return None
+
+    path = re.match(r'^([^?#]*)', url).group(1)
+
+    if path.startswith('/'):
+        return posixpath.normpath(path.lstrip('/'))
+
+    return posixpath.normpath(posixpath.join(posixpath.dirname(key), path))
+
+
+def rewrite_url(url, key, renames):
+    """Rewrite a single reference made from key if its target was renamed"""
+    target = reference_target(url, key)
+
+    if target not in renames:
+        return url
+
+    path, suffix = re.match(r'^([^?#]*)(.*)$', url).groups()
+
+    return posixpath.join(
+        posixpath.dirname(path), posixpath.basename(renames[target])) + suffix
+
+
+def rewrite_references(text, key, renames):
+    """Rewrite asset references in HTML or CSS text made from key"""
+
+    def replace(match):
+        prefix, quote, url = match.groups()
+        return prefix + quote + rewrite_url(url, key, renames) + quote
+
+    def replace_srcset(match):
+        prefix, quote, value = match.groups()
+        candidates = []
+
+        for candidate in value.split(','):
+            parts = candidate.strip().split(None, 1)
+            if parts:
+                parts[0] = rewrite_url(parts[0], key, renames)
+            candidates.append(' '.join(parts))
+
+        return prefix + quote + ', '.join(candidates) + quote
+
+    if extension(key) != '.css':
+        text = HTML_REFERENCES.sub(replace, text)
+        text = SRCSET_REFERENCES.sub(replace_srcset, text)
+
+    return CSS_REFERENCES.sub(replace, text)
+
+
+def css_references(path, key):
+    """Keys referenced by the stylesheet at path"""
+    with open(path, 'rb') as file:
+        text = file.read().decode('utf-8', 'surrogateescape')
+
+    targets = (reference_target(url, key)
+               for _, _, url in CSS_REFERENCES.findall(text))
+    return {target for target in targets if target}
+
+
+def rewrite_file(path, key, renames):
+    """Return the bytes of path with references rewritten, or None"""
+    with open(path, 'rb') as file:
+        data = file.read()
+
+    text = data.decode('utf-8', 'surrogateescape')
+    rewritten = rewrite_references(text, key, renames)
+
+    if rewritten == text:
+        return None
+
+    return rewritten.encode('utf-8', 'surrogateescape')
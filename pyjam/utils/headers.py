@@ -0,0 +1,95 @@
+"""Utilities for per-path object headers such as Cache-Control"""
+
+import json
+import mimetypes
+import os
+import re
+from fnmatch import translate
+
+HEADERS_FILE = '.jamheaders'
+
+HEADER_ARGS = {
+    'cache-control': 'CacheControl',
+    'content-disposition': 'ContentDisposition',
+    'content-language': 'ContentLanguage',
+    'content-type': 'ContentType',
+    'website-redirect-location': 'WebsiteRedirectLocation',
+}
+METADATA_PREFIX = 'x-amz-meta-'
+
+
+def header_args(headers):
+    """Convert HTTP style headers to S3 ExtraArgs"""
+    args = {}
+
+    for name, value in headers.items():
+        name = name.lower()
+
+        if name.startswith(METADATA_PREFIX):
+            metadata = args.setdefault('Metadata', {})
+            metadata[name[len(METADATA_PREFIX):]] = value
+        elif name in HEADER_ARGS:
+            args[HEADER_ARGS[name]] = value
+        else:
+            raise ValueError('unsupported header {0}'.format(name))
+
+    return args
+
+
+def object_headers(response):
+    """Extract the headers managed by HeaderRules from a head response"""
+    args = {
+        arg: response[arg]
+        for arg in HEADER_ARGS.values() if response.get(arg)
+    }
+
+    if response.get('Metadata'):
+        args['Metadata'] = response['Metadata']
+
+    return args
+
+
+class HeaderRules:
+    """
+    Ordered glob pattern to header rules, compiled once. Patterns
+    containing a slash match the whole key, others match the file name
+    at any depth. Later matching rules override earlier ones.
+    """
+
+    def __init__(self, rules=()):
+        """Compile (pattern, headers) pairs"""
+        self.rules = []
+
+        for pattern, headers in rules:
+            anchored = '/' in pattern
+            regex = re.compile(translate(pattern.lstrip('/')))
+            self.rules.append((anchored, regex, header_args(headers)))
+
+    @classmethod
+    def load(cls, root, path=None):
+        """Build rules from a JSON file, by default root's .jamheaders"""
+        path = path or os.path.join(root, HEADERS_FILE)
+
+        try:
+            with open(path) as file:
+                return cls(json.load(file).items())
+
+        except FileNotFoundError:
+            return None
+
+    def headers(self, key):
+        """Return the S3 ExtraArgs headers for key"""
+        content_type = mimetypes.guess_type(key)[0] or 'text/plain'
+        args = {'ContentType': content_type}
+        name = key.rsplit('/', 1)[-1]
+
+        for anchored, regex, headers in self.rules:
+            if regex.match(key if anchored else name):
+                metadata = dict(args.get('Metadata', {}),
+                                **headers.get('Metadata', {}))
+                args.update(headers)
+
+                if metadata:
+                    args['Metadata'] = metadata
+
+        return args
@@ -0,0 +1,192 @@
+"""Persistent local journal of sync progress, for resuming syncs"""
+
+import json
+import os
+import threading
+import time
+from collections import namedtuple
+from pyjam.constants import CACHE_DIR, MANIFEST_MAX_AGE
+from pyjam.utils.database import connect
+
+JOURNAL_VERSION = 1
+JOURNAL_TABLES = ('syncs', 'objects', 'uploads', 'parts')
+JOURNAL_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS syncs (
+        bucket TEXT PRIMARY KEY,
+        started REAL NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS objects (
+        bucket TEXT NOT NULL,
+        key TEXT NOT NULL,
+        etag TEXT NOT NULL,
+        headers TEXT,
+        PRIMARY KEY (bucket, key)
+    );
+    CREATE TABLE IF NOT EXISTS uploads (
+        bucket TEXT NOT NULL,
+        key TEXT NOT NULL,
+        upload_id TEXT NOT NULL,
+        etag TEXT NOT NULL,
+        part_size INTEGER NOT NULL,
+        PRIMARY KEY (bucket, key)
+    );
+    CREATE TABLE IF NOT EXISTS parts (
+        upload_id TEXT NOT NULL,
+        part_number INTEGER NOT NULL,
+        etag TEXT NOT NULL,
+        PRIMARY KEY (upload_id, part_number)
+    );'''
+
+Upload = namedtuple('Upload', ['upload_id', 'etag', 'part_size', 'parts'])
+
+
+class SyncJournal:
+    """
+    SQLite backed record of syncs in progress. For each bucket it keeps
+    the remote state the sync started from, updated as objects are
+    uploaded and deleted, and the multipart uploads in flight with the
+    parts they have completed. A finished sync clears its bucket.
+    Objects are only recorded for syncs started with begin(); others,
+    such as streaming and watch syncs, only journal multipart uploads.
+    """
+
+    def __init__(self, path=None):
+        """Open (or create) the journal database"""
+        self.lock = threading.Lock()
+        self.begun = set()
+        self.db = connect(
+            path or os.path.join(
+                os.path.expanduser(CACHE_DIR), 'journal.db'), 'sync journal',
+            JOURNAL_VERSION, JOURNAL_TABLES, JOURNAL_SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def execute(self, *statements):
+        """Run (sql, params) statements in one committed transaction"""
+        with self.lock, self.db:
+            for sql, params in statements:
+                self.db.execute(sql, params)
+
+    def begin(self, bucket, checksums, headers=None):
+        """Record that a sync of bucket starts from checksums and headers"""
+        headers = headers or {}
+        self.begun.add(bucket)
+
+        with self.lock, self.db:
+            self.db.execute('DELETE FROM objects WHERE bucket = ?', (bucket, ))
+            self.db.execute('INSERT OR REPLACE INTO syncs VALUES (?, ?)',
+                            (bucket, time.time()))
+            self.db.executemany(
+                'INSERT INTO objects VALUES (?, ?, ?, ?)',
+                ((bucket, key, etag, json.dumps(headers[key])
+                  if key in headers else None)
+                 for key, etag in checksums.items()))
+
+    def remote(self, bucket, max_age=MANIFEST_MAX_AGE):
+        """
+        Return (checksums, headers) for bucket as left by an interrupted
+        sync, or None if there is none or it is older than max_age.
+        """
+        with self.lock:
+            row = self.db.execute('SELECT started FROM syncs WHERE bucket = ?',
+                                  (bucket, )).fetchone()
+
+            if not row or time.time() - row[0] > max_age:
+                return None
+
+            rows = self.db.execute(
+                'SELECT key, etag, headers FROM objects WHERE bucket = ?',
+                (bucket, )).fetchall()
+
+        checksums, headers = {}, {}
+
+        for key, etag, object_headers in rows:
+            checksums[key] = etag
+
+            if object_headers is not None:
+                headers[key] = json.loads(object_headers)
+
+        return checksums, headers
+
+    def record(self, bucket, key, etag, headers=None):
+        """Record that key now holds etag with headers"""
+        if bucket not in self.begun:
+            return
+
+        self.execute(('INSERT OR REPLACE INTO objects VALUES (?, ?, ?, ?)',
+                      (bucket, key, etag, None
+                       if headers is None else json.dumps(headers))))
+
+    def forget(self, bucket, keys):
+        """Record that keys were deleted"""
+        if bucket not in self.begun:
+            return
+
+        self.execute(*(('DELETE FROM objects WHERE bucket = ? AND key = ?',
+                        (bucket, key)) for key in keys))
+
+    def finish(self, bucket):
+        """
+        Clear a completed sync of bucket. Returns (key, upload_id) of the
+        multipart uploads it left unfinished, which can be aborted.
+        """
+        self.begun.discard(bucket)
+
+        with self.lock, self.db:
+            uploads = self.db.execute(
+                'SELECT key, upload_id FROM uploads WHERE bucket = ?',
+                (bucket, )).fetchall()
+
+            for _, upload_id in uploads:
+                self.db.execute('DELETE FROM parts WHERE upload_id = ?',
+                                (upload_id, ))
+
+            for table in ('syncs', 'objects', 'uploads'):
+                self.db.execute(
+                    'DELETE FROM {0} WHERE bucket = ?'.format(table),
+                    (bucket, ))
+
+        return uploads
+
+    def find_upload(self, bucket, key):
+        """Return the Upload in progress for key, or None"""
+        with self.lock:
+            row = self.db.execute(
+                'SELECT upload_id, etag, part_size FROM uploads '
+                'WHERE bucket = ? AND key = ?', (bucket, key)).fetchone()
+
+            if not row:
+                return None
+
+            parts = dict(
+                self.db.execute(
+                    'SELECT part_number, etag FROM parts WHERE upload_id = ?',
+                    (row[0], )).fetchall())
+
+        return Upload(row[0], row[1], row[2], parts)
+
+    def start_upload(self, bucket, key, upload_id, etag, part_size):
+        """Record a new multipart upload of key with content etag"""
+        self.execute(('INSERT OR REPLACE INTO uploads VALUES (?, ?, ?, ?, ?)',
+                      (bucket, key, upload_id, etag, part_size)))
+
+    def add_part(self, upload_id, part_number, etag):
+        """Record a completed part of a multipart upload"""
+        self.execute(('INSERT OR REPLACE INTO parts VALUES (?, ?, ?)',
+                      (upload_id, part_number, etag)))
+
+    def end_upload(self, bucket, key, upload_id):
+        """Forget a multipart upload that was completed or aborted"""
+        self.execute(
+            ('DELETE FROM uploads WHERE bucket = ? AND key = ? '
+             'AND upload_id = ?', (bucket, key, upload_id)),
+            ('DELETE FROM parts WHERE upload_id = ?', (upload_id, )))
+
+    def close(self):
+        """Close the database"""
+        with self.lock:
+            self.db.close()
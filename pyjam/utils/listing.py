@@ -0,0 +1,80 @@
+"""Utilities for listing bucket objects in parallel partitions"""
+
+from pyjam.constants import LISTING_MAX_DEPTH
+from pyjam.utils.pool import bounded_map, ordered_map
+
+
+def list_level(client, bucket_name, prefix):
+    """List one level under prefix, returning (objects, common prefixes)"""
+    objects, prefixes = [], []
+    paginator = client.get_paginator('list_objects_v2')
+
+    for page in paginator.paginate(
+            Bucket=bucket_name, Prefix=prefix, Delimiter='/'):
+        objects.extend(page.get('Contents', []))
+        prefixes.extend(p['Prefix'] for p in page.get('CommonPrefixes', []))
+
+    return objects, prefixes
+
+
+def iter_objects(client, bucket_name, prefix=''):
+    """Yield object summaries under prefix in key order, page by page"""
+    paginator = client.get_paginator('list_objects_v2')
+
+    for page in paginator.paginate(Bucket=bucket_name, Prefix=prefix):
+        yield from page.get('Contents', [])
+
+
+def list_partition(client, bucket_name, prefix):
+    """List every object under prefix"""
+    return list(iter_objects(client, bucket_name, prefix))
+
+
+def discover_partitions(client, bucket_name, prefix, max_workers):
+    """
+    Split the keys under prefix into partitions using Delimiter.
+    Levels are expanded while there are fewer partitions than workers.
+    Returns (objects found along the way, partition prefixes).
+    """
+    objects, prefixes = list_level(client, bucket_name, prefix)
+    depth = 1
+
+    while prefixes and len(prefixes) < max_workers and \
+    depth < LISTING_MAX_DEPTH:
+
+        def expand(sub_prefix):
+            """Lists a single partition's next level on a worker thread"""
+            return list_level(client, bucket_name, sub_prefix)
+
+        expanded = []
+        for level_objects, level_prefixes in bounded_map(
+                expand, prefixes, max_workers):
+            objects.extend(level_objects)
+            expanded.extend(level_prefixes)
+
+        prefixes = expanded
+        depth += 1
+
+    return objects, prefixes
+
+
+def list_objects(client, bucket_name, prefix='', max_workers=1):
+    """
+    Yield object summaries under prefix in key order. Top-level
+    prefixes are discovered with Delimiter and listed concurrently,
+    then merged back in order, since every partition covers a
+    contiguous range of keys.
+    """
+    objects, prefixes = discover_partitions(client, bucket_name, prefix,
+                                            max_workers)
+    items = sorted([(obj['Key'], obj) for obj in objects] +
+                   [(partition, None) for partition in prefixes],
+                   key=lambda item: item[0])
+
+    def fetch(item):
+        """Lists a single partition on a worker thread"""
+        key, obj = item
+        return [obj] if obj else list_partition(client, bucket_name, key)
+
+    for partition in ordered_map(fetch, items, max_workers):
+        yield from partition
@@ -0,0 +1,76 @@
+"""Utilities for the remote sync manifest stored in each bucket"""
+
+import gzip
+import json
+import time
+from botocore.exceptions import ClientError
+from pyjam.constants import MANIFEST_KEY, MANIFEST_MAX_AGE
+
+MANIFEST_VERSION = 1
+
+
+def load_manifest(client, bucket_name, max_age=MANIFEST_MAX_AGE):
+    """
+    Load the manifest written by the last successful sync.
+    Returns (checksums, headers) mappings keyed by object key, or
+    None if the manifest is missing, too old or of another format.
+    Changes made to the bucket by other tools are not detected.
+    """
+    try:
+        response = client.get_object(Bucket=bucket_name, Key=MANIFEST_KEY)
+        manifest = json.loads(gzip.decompress(response['Body'].read()))
+
+    except ClientError as err:
+        if err.response['Error']['Code'] not in ('NoSuchKey', '404'):
+            print('Unable to load manifest from {0}. '.format(bucket_name) +
+                  str(err) + '\n')
+        return None
+
+    except (OSError, ValueError):
+        return None
+
+    age = time.time() - response['LastModified'].timestamp()
+
+    if manifest.get('version') != MANIFEST_VERSION or age > max_age:
+        return None
+
+    checksums, headers = {}, {}
+
+    for key, (etag, _, object_headers) in manifest['objects'].items():
+        checksums[key] = etag
+
+        if object_headers is not None:
+            headers[key] = object_headers
+
+    return checksums, headers
+
+
+def invalidate_manifest(client, bucket_name):
+    """
+    Remove the manifest before a sync changes the bucket, so a sync
+    that dies part way forces the next one to list the bucket.
+    """
+    client.delete_object(Bucket=bucket_name, Key=MANIFEST_KEY)
+
+
+def write_manifest(client, bucket_name, objects):
+    """Write objects, a mapping of key to (etag, size, headers)"""
+    body = json.dumps(
+        {
+            'version': MANIFEST_VERSION,
+            'objects': objects
+        },
+        separators=(',', ':'),
+        sort_keys=True).encode('utf-8')
+
+    try:
+        client.put_object(
+            Bucket=bucket_name,
+            Key=MANIFEST_KEY,
+            Body=gzip.compress(body),
+            ContentType='application/json',
+            ContentEncoding='gzip')
+
+    except ClientError as err:
+        print('Unable to write manifest to {0}. '.format(bucket_name) +
+              str(err) + '\n')
@@ -0,0 +1,286 @@
+"""Pipeline stages for syncing files to S3"""
+
+import json
+import os
+import tempfile
+from collections import namedtuple
+from hashlib import md5
+from concurrent.futures import FIRST_COMPLETED, wait
+from pyjam.constants import CACHE_DIR, INLINE_HASH_SIZE, MANIFEST_KEY
+from pyjam.utils.checksum import candidate_part_sizes, etag_parts, \
+generate_checksum
+from pyjam.utils.compress import EXTENSIONS, compress_file, is_compressible
+from pyjam.utils.fingerprint import css_references, extension, \
+fingerprint_key, rewrite_file, should_fingerprint, should_rewrite
+from pyjam.utils.pool import bounded_map, process_pool
+
+LocalFile = namedtuple('LocalFile',
+                       ['path', 'key', 'etag', 'size', 'encoding', 'headers'])
+
+
+class KeySpool:
+    """Keys spooled to a temporary file instead of held in memory"""
+
+    def __init__(self):
+        """Open the backing temporary file"""
+        self.file = tempfile.TemporaryFile('w+', encoding='utf-8')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.file.close()
+
+    def add(self, key):
+        """Spool a key, JSON encoded since keys may contain newlines"""
+        self.file.write(json.dumps(key) + '\n')
+
+    def __iter__(self):
+        """Read the spooled keys back in the order they were added"""
+        self.file.seek(0)
+
+        for line in self.file:
+            yield json.loads(line)
+
+
+def merge_remote(items, objects, remote, on_delete):
+    """
+    Merge join (path, key, stat) items from an ordered walk with object
+    summaries listed in the same key order. The ETag of each key found
+    on both sides is parked in remote until the key is planned, and
+    keys found only remotely are passed to on_delete with their ETag,
+    so neither side is ever held in memory in full.
+    """
+    objects = (obj for obj in objects if obj['Key'] != MANIFEST_KEY)
+    obj = next(objects, None)
+
+    for item in items:
+        key = item[1]
+
+        while obj is not None and obj['Key'] < key:
+            on_delete(obj['Key'], obj['ETag'])
+            obj = next(objects, None)
+
+        if obj is not None and obj['Key'] == key:
+            remote[key] = obj['ETag']
+            obj = next(objects, None)
+
+        yield item
+
+    while obj is not None:
+        on_delete(obj['Key'], obj['ETag'])
+        obj = next(objects, None)
+
+
+def checksum_files(items, cache, max_workers=None):
+    """
+    Yield a LocalFile for each (path, key, stat) in items.
+    Cached checksums and small files are resolved on this thread;
+    everything else is hashed on a process pool sized to the machine's
+    cores and yielded as soon as it completes, so a downstream upload
+    stage can start before the whole tree is hashed.
+    """
+    max_workers = max_workers or os.cpu_count() or 1
+    limit = max_workers * 2
+    pending = {}
+
+    def drain(return_when):
+        """Wait for hashing jobs and yield their results"""
+        done, _ = wait(pending, return_when=return_when)
+        for future in done:
+            path, key, stat_key = pending.pop(future)
+            etag = future.result()
+            cache.store(path, stat_key, etag)
+            yield LocalFile(path, key, etag, stat_key[0], None, None)
+
+    with process_pool(max_workers) as executor:
+        try:
+            for path, key, stat in items:
+                stat_key, etag = cache.lookup(path, stat)
+
+                if etag is None and stat_key[0] <= INLINE_HASH_SIZE:
+                    etag = generate_checksum(path)
+                    cache.store(path, stat_key, etag)
+
+                if etag is not None:
+                    yield LocalFile(path, key, etag, stat_key[0], None, None)
+                    continue
+
+                future = executor.submit(generate_checksum, path)
+                pending[future] = (path, key, stat_key)
+
+                if len(pending) >= limit:
+                    yield from drain(FIRST_COMPLETED)
+
+            while pending:
+                yield from drain(FIRST_COMPLETED)
+
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+def local_files(items, cache, fingerprint=False, compression=None):
+    """
+    Hash (path, key, stat) items into LocalFiles, fingerprinting and
+    compressing them if asked. Nothing here depends on the bucket.
+    """
+    files = checksum_files(items, cache)
+
+    if fingerprint:
+        files = fingerprint_files(files)
+
+    if compression:
+        files = compress_files(files, cache, compression)
+
+    return files
+
+
+def compress_files(files, cache, compression, max_workers=None):
+    """
+    Swap text-like LocalFiles for pre-compressed copies.
+    Compressed outputs are kept in the cache directory keyed by source
+    ETag, so unchanged files are never recompressed, and the yielded
+    ETag is that of the compressed bytes that will be uploaded.
+    """
+    directory = os.path.join(os.path.expanduser(CACHE_DIR), 'compressed')
+    extension = EXTENSIONS[compression.encoding]
+
+    def compress(file):
+        """Compress a single file on a worker thread"""
+        if file.size < compression.min_size or not is_compressible(file.key):
+            return file
+
+        dest = os.path.join(directory, '{0}.{1}{2}'.format(
+            file.etag.strip('"'), compression.level, extension))
+
+        if not os.path.exists(dest):
+            compress_file(file.path, dest, compression.encoding,
+                          compression.level)
+
+        size = os.path.getsize(dest)
+
+        if size >= file.size:
+            return file
+
+        return file._replace(
+            path=dest,
+            etag=cache.checksum(dest),
+            size=size,
+            encoding=compression.encoding)
+
+    # zlib and brotli release the GIL, so threads compress in parallel
+    return bounded_map(compress, files, max_workers or os.cpu_count() or 1)
+
+
+def apply_headers(files, rules):
+    """Attach the headers from HeaderRules to each LocalFile"""
+    for file in files:
+        yield file._replace(headers=rules.headers(file.key))
+
+
+def order_stylesheets(files):
+    """
+    Order stylesheet LocalFiles so each comes after those it imports.
+    In an import cycle, the file reached first comes last.
+    """
+    by_key = {file.key: file for file in files}
+    visited = set()
+    ordered = []
+
+    def visit(file):
+        """Append file after the stylesheets it references"""
+        visited.add(file.key)
+
+        for target in sorted(css_references(file.path, file.key)):
+            if target in by_key and target not in visited:
+                visit(by_key[target])
+
+        ordered.append(file)
+
+    for file in files:
+        if file.key not in visited:
+            visit(file)
+
+    return ordered
+
+
+def fingerprint_files(files):
+    """
+    Copy CSS, JS and image LocalFiles to name.<hash>.ext, reusing
+    their ETag, and rewrite references to them in HTML and CSS.
+    Assets are also kept under their original names, since JS and
+    pages cached before the sync may still reference those.
+    Assets are yielded straight away; HTML and CSS are held back until
+    every asset is hashed, since their content depends on the new names.
+    """
+    directory = os.path.join(os.path.expanduser(CACHE_DIR), 'fingerprint')
+    renames = {}
+    held = []
+
+    for file in files:
+        if should_rewrite(file.key):
+            held.append(file)
+            continue
+
+        if should_fingerprint(file.key):
+            renames[file.key] = fingerprint_key(file.key, file.etag)
+            yield file._replace(key=renames[file.key])
+
+        yield file
+
+    # stylesheets first, in import order, so the files referencing
+    # them pick up their fingerprinted names
+    stylesheets = [file for file in held if extension(file.key) == '.css']
+    pages = [file for file in held if extension(file.key) != '.css']
+
+    for file in order_stylesheets(stylesheets) + pages:
+        data = rewrite_file(file.path, file.key, renames)
+
+        if data is not None:
+            dest = os.path.join(directory,
+                                md5(data).hexdigest() + extension(file.key))
+
+            if not os.path.exists(dest):
+                os.makedirs(directory, exist_ok=True)
+                fd, tmp_path = tempfile.mkstemp(dir=directory)
+                with os.fdopen(fd, 'wb') as target:
+                    target.write(data)
+                os.replace(tmp_path, dest)
+
+            file = file._replace(
+                path=dest, etag=generate_checksum(dest), size=len(data))
+
+        if should_fingerprint(file.key):
+            renames[file.key] = fingerprint_key(file.key, file.etag)
+            yield file._replace(key=renames[file.key])
+
+        yield file
+
+
+def match_part_sizes(files, remote, cache, max_workers=None):
+    """
+    Reconcile LocalFile ETags with remote objects uploaded under a
+    different part size. When the part counts differ, the file is
+    rehashed with each part size that yields the remote part count,
+    and the remote ETag is kept if one matches, so changing the part
+    size policy never forces a re-upload of unchanged content.
+    """
+
+    def match(file):
+        """Rehash a single file on a worker thread if needed"""
+        remote_etag = remote.get(file.key)
+
+        if not remote_etag or remote_etag == file.etag or \
+        etag_parts(remote_etag) == etag_parts(file.etag):
+            return file
+
+        for part_size in candidate_part_sizes(file.size,
+                                              etag_parts(remote_etag)):
+            if cache.checksum(file.path, part_size) == remote_etag:
+                return file._replace(etag=remote_etag)
+
+        return file
+
+    # hashlib releases the GIL, so threads hash in parallel
+    return bounded_map(match, files, max_workers or os.cpu_count() or 1)
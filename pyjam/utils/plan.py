@@ -0,0 +1,247 @@
+"""Sync plans describing what a sync will upload, skip and delete"""
+
+import json
+from collections import namedtuple
+from pyjam.utils.fingerprint import fingerprint_origin
+
+UPLOAD = 'upload'
+COPY = 'copy'
+UPDATE = 'update'
+SKIP = 'skip'
+DELETE = 'delete'
+
+SyncAction = namedtuple(
+    'SyncAction',
+    ['action', 'key', 'path', 'etag', 'size', 'encoding', 'headers', 'source'])
+
+
+class SyncPlan:
+    """Class for a sync plan, built as local files are hashed"""
+
+    def __init__(self,
+                 remote,
+                 remote_headers=None,
+                 retain=True,
+                 fingerprint=False):
+        """
+        Plan against remote, a mapping of key to ETag, and optionally
+        remote_headers, a mapping of key to the object's managed headers.
+        Without retain, only totals are kept and remote entries are
+        consumed as they are planned, so memory does not grow with the
+        number of keys (deletes must then come from the caller).
+        With fingerprint, earlier fingerprinted versions of local assets
+        are not deleted, so cached pages that use them keep working.
+        They stay in the manifest until the asset itself is removed.
+        """
+        if remote_headers is None:
+            remote_headers = {}
+
+        self.remote = remote
+        self.remote_headers = remote_headers
+        self.retain = retain
+        self.fingerprint = fingerprint
+        self.sources = None
+        self.uploads = []
+        self.copies = []
+        self.updates = []
+        self.skips = []
+        self.deletes = []
+        self.local_keys = set()
+        self.retained = {}
+        self.failed = {}
+        self.counts = {UPLOAD: 0, COPY: 0, UPDATE: 0, SKIP: 0, DELETE: 0}
+        self.bytes_to_transfer = 0
+
+    def add(self, action):
+        """Record an action in the plan"""
+        self.counts[action.action] += 1
+
+        if action.action == UPLOAD:
+            self.bytes_to_transfer += action.size
+
+        if not self.retain:
+            return action
+
+        if action.action == UPLOAD:
+            self.uploads.append(action)
+        elif action.action == COPY:
+            self.copies.append(action)
+        elif action.action == UPDATE:
+            self.updates.append(action)
+        elif action.action == SKIP:
+            self.skips.append(action)
+        else:
+            self.deletes.append(action)
+
+        if action.action != DELETE:
+            self.local_keys.add(action.key)
+
+        return action
+
+    def source_for(self, etag):
+        """
+        Existing remote key holding content with etag, or None. The
+        ETag index is built on first use, when remote is fully loaded.
+        """
+        if not self.retain:
+            return None
+
+        if self.sources is None:
+            self.sources = {etag: key for key, etag in self.remote.items()}
+
+        return self.sources.get(etag)
+
+    def plan_files(self, files):
+        """
+        Yield an upload, copy, update or skip action for each LocalFile.
+        Files whose content the bucket already holds under another key
+        are copied server-side, and files with unchanged content but
+        different headers are updated in place instead of uploaded.
+        """
+        for file in files:
+            if self.retain:
+                remote_etag = self.remote.get(file.key)
+                remote_headers = self.remote_headers.get(file.key)
+            else:
+                remote_etag = self.remote.pop(file.key, None)
+                remote_headers = self.remote_headers.pop(file.key, None)
+
+            source = None
+
+            if remote_etag != file.etag:
+                source = self.source_for(file.etag)
+                action = COPY if source else UPLOAD
+            elif file.headers is not None and \
+            remote_headers != file.headers:
+                action = UPDATE
+            else:
+                action = SKIP
+
+            yield self.add(
+                SyncAction(action, file.key, file.path, file.etag, file.size,
+                           file.encoding, file.headers, source))
+
+    def delete(self, key, etag):
+        """Record that key is to be deleted"""
+        return self.add(
+            SyncAction(DELETE, key, None, etag, 0, None, None, None))
+
+    def plan_deletes(self):
+        """Yield a delete action for each remote key with no local file"""
+        if not self.retain:
+            return
+
+        for key, etag in self.remote.items():
+            if key in self.local_keys or key in self.failed:
+                continue
+
+            if self.fingerprint and fingerprint_origin(key) in self.local_keys:
+                self.retained[key] = etag
+                continue
+
+            yield self.delete(key, etag)
+
+    def complete(self, actions):
+        """Consume file actions and plan deletes without executing"""
+        for _ in actions:
+            pass
+
+        for _ in self.plan_deletes():
+            pass
+
+        return self
+
+    def apply(self):
+        """
+        Update remote and remote_headers to the state after the run.
+        Failed keys are left as they were, and deletes only run once
+        every other action has succeeded.
+        """
+        for action in self.uploads + self.copies + self.updates:
+            if action.key in self.failed:
+                continue
+
+            self.remote[action.key] = action.etag
+
+            if action.headers is None:
+                self.remote_headers.pop(action.key, None)
+            else:
+                self.remote_headers[action.key] = action.headers
+
+        for action in [] if self.failed else self.deletes:
+            self.remote.pop(action.key, None)
+            self.remote_headers.pop(action.key, None)
+
+        return self
+
+    def manifest(self):
+        """
+        Mapping of key to (etag, size, headers) after the plan is run.
+        Retained fingerprints are included with an unknown size, so the
+        next sync can delete them along with their asset.
+        """
+        objects = {
+            key: (etag, None, self.remote_headers.get(key))
+            for key, etag in self.retained.items()
+        }
+
+        for action in self.uploads + self.copies + self.updates + self.skips:
+            headers = action.headers
+
+            if headers is None and action.action == SKIP:
+                headers = self.remote_headers.get(action.key)
+
+            objects[action.key] = (action.etag, action.size, headers)
+
+        return objects
+
+    def summary(self):
+        """Human readable summary of the plan"""
+        deleted = {a.key for a in self.deletes}
+        lines = ['Would upload {0} ({1} bytes)'.format(a.key, a.size)
+                 for a in self.uploads]
+        lines += ['Would {0} {1} to {2}'.format(
+            'move' if a.source in deleted else 'copy', a.source, a.key)
+                  for a in self.copies]
+        lines += ['Would update headers of {0}'.format(a.key)
+                  for a in self.updates]
+        lines += ['Would delete {0}'.format(a.key) for a in self.deletes]
+        lines.append(
+            '\n{0} to upload, {1} to copy, {2} to update, {3} to skip, '
+            '{4} to delete, {5} bytes to transfer.'.format(
+                self.counts[UPLOAD], self.counts[COPY], self.counts[UPDATE],
+                self.counts[SKIP], self.counts[DELETE],
+                self.bytes_to_transfer))
+
+        return '\n'.join(lines)
+
+    def to_dict(self):
+        """Plan as a dict of plain values"""
+
+        def entries(actions):
+            return [{
+                'key': a.key,
+                'path': a.path,
+                'etag': a.etag,
+                'size': a.size,
+                'encoding': a.encoding,
+                'headers': a.headers,
+                'source': a.source
+            } for a in actions]
+
+        return {
+            'uploads': entries(self.uploads),
+            'copies': entries(self.copies),
+            'updates': entries(self.updates),
+            'skips': entries(self.skips),
+            'deletes': [{
+                'key': a.key,
+                'etag': a.etag
+            } for a in self.deletes],
+            'counts': self.counts,
+            'bytes_to_transfer': self.bytes_to_transfer
+        }
+
+    def to_json(self):
+        """Machine readable representation of the plan"""
+        return json.dumps(self.to_dict(), indent=2)
@@ -0,0 +1,29 @@
+"""Utilities for polling AWS until resources are ready"""
+
+import time
+from pyjam.constants import POLL_INITIAL, POLL_MAX_DELAY
+
+
+def poll(check, timeout, initial=POLL_INITIAL, max_delay=POLL_MAX_DELAY):
+    """
+    Call check until it returns something other than None, sleeping
+    between calls for initial seconds at first and twice as long each
+    time after, up to max_delay. Returns the result of check, or None
+    once timeout seconds have passed.
+    """
+    deadline = time.monotonic() + timeout
+    delay = initial
+
+    while True:
+        result = check()
+
+        if result is not None:
+            return result
+
+        remaining = deadline - time.monotonic()
+
+        if remaining <= 0:
+            return None
+
+        time.sleep(min(delay, remaining))
+        delay = min(delay * 2, max_delay)
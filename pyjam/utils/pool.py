@@ -0,0 +1,84 @@
+"""Utilities for running work on bounded thread pools"""
+
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, \
+FIRST_COMPLETED, wait
+from itertools import islice
+
+
+def batched(items, size):
+    """Yield lists of up to size items from items"""
+    items = iter(items)
+    batch = list(islice(items, size))
+
+    while batch:
+        yield batch
+        batch = list(islice(items, size))
+
+
+def process_pool(max_workers):
+    """
+    Process pool whose workers are started by a forkserver where the
+    platform has one, and spawned otherwise. The pool is created once
+    upload threads are running, and forking a threaded process can
+    leave locks held in the child.
+    """
+    method = 'forkserver' \
+    if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+
+    return ProcessPoolExecutor(
+        max_workers=max_workers, mp_context=multiprocessing.get_context(method))
+
+
+def bounded_map(func, items, max_workers):
+    """
+    Apply func to each item on a pool of max_workers threads.
+    Results are yielded in completion order and at most 2 * max_workers
+    items are in flight, so items can be a lazy generator.
+    """
+    limit = max(1, max_workers) * 2
+    pending = set()
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        try:
+            for item in items:
+                pending.add(executor.submit(func, item))
+
+                if len(pending) >= limit:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield future.result()
+
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+def ordered_map(func, items, max_workers):
+    """
+    Like bounded_map, but results are yielded in the order of items.
+    Up to 2 * max_workers items are processed ahead of the one yielded.
+    """
+    limit = max(1, max_workers) * 2
+    pending = deque()
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        try:
+            for item in items:
+                pending.append(executor.submit(func, item))
+
+                if len(pending) >= limit:
+                    yield pending.popleft().result()
+
+            while pending:
+                yield pending.popleft().result()
+
+        finally:
+            for future in pending:
+                future.cancel()
@@ -0,0 +1,68 @@
+"""Utilities for retrying failed transfers without stopping a sync"""
+
+import time
+from boto3.exceptions import S3UploadFailedError
+from botocore.exceptions import BotoCoreError, ClientError, HTTPClientError
+from botocore.exceptions import ConnectionError as EndpointError
+from pyjam.constants import RETRY_ATTEMPTS
+from pyjam.utils.throttle import THROTTLE_CODES, backoff, error_code
+
+# errors that fail a single file rather than the whole sync
+TRANSFER_ERRORS = (ClientError, S3UploadFailedError, BotoCoreError, OSError)
+
+# connection errors and timeouts, from botocore or raised by the socket
+CONNECTION_ERRORS = (EndpointError, HTTPClientError, ConnectionError,
+                     TimeoutError)
+
+RETRYABLE_CODES = THROTTLE_CODES | {
+    'InternalError', 'RequestTimeout', 'RequestTimeTooSkewed',
+    'IncompleteBody', 'BadDigest', 'NoSuchUpload', '500', '502', '504'
+}
+
+
+def is_retryable(err):
+    """Return True if err may go away when the request is repeated"""
+    # connection errors are worth retrying, local file errors and other
+    # botocore errors, such as missing credentials, are not
+    if isinstance(err, CONNECTION_ERRORS):
+        return True
+
+    if isinstance(err, (OSError, BotoCoreError)):
+        return False
+
+    return error_code(err) in RETRYABLE_CODES
+
+
+class RetryQueue:
+    """
+    Actions that failed, retried in rounds with growing backoff. Fatal
+    errors, and errors that outlast RETRY_ATTEMPTS, end up in failed.
+    """
+
+    def __init__(self, attempts=RETRY_ATTEMPTS):
+        """Allow each key up to attempts tries in total"""
+        self.max_attempts = attempts
+        self.attempts = {}
+        self.pending = []
+        self.failed = {}
+
+    def add(self, action, err):
+        """Queue a failed action for retry, or record it as failed"""
+        attempts = self.attempts[action.key] = \
+        self.attempts.get(action.key, 0) + 1
+
+        if is_retryable(err) and attempts < self.max_attempts:
+            self.pending.append(action)
+        else:
+            self.failed[action.key] = str(err)
+
+    def rounds(self):
+        """Yield the actions to retry, in rounds, until none are left"""
+        attempt = 0
+
+        while self.pending:
+            time.sleep(backoff(attempt))
+            attempt += 1
+            pending, self.pending = self.pending, []
+
+            yield pending
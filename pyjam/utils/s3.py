@@ -2,6 +2,7 @@
 
 from collections import namedtuple
 from botocore.exceptions import ClientError
+from pyjam.constants import METADATA_PREFIX
 
 Endpoint = namedtuple('Endpoint', ['host', 'zone'])
 
@@ -48,11 +49,10 @@ def get_endpoint(region):
     return REGION_ENDPOINTS[region]
 
 
-def get_bucket_region(session, bucket_name):
-    """Get the bucket's region name."""
+def get_bucket_region(client, bucket_name):
+    """Get the bucket's region name, using an S3 client."""
     try:
-        bucket_location = session.resource(
-            's3').meta.client.get_bucket_location(Bucket=bucket_name)
+        bucket_location = client.get_bucket_location(Bucket=bucket_name)
         return bucket_location["LocationConstraint"] or 'us-east-1'
 
     except ClientError as err:
@@ -60,8 +60,11 @@ def get_bucket_region(session, bucket_name):
               '\n')
 
 
-def set_bucket_policy(bucket):
-    """Configures bucket policy to allow public reads"""
+def set_bucket_policy(bucket, account_id):
+    """
+    Configures bucket policy to allow public reads, except of the sync
+    manifest under .pyjam/, which only account_id may read
+    """
     policy = '''
     {
         "Version":"2012-10-17",
@@ -71,11 +74,22 @@ def set_bucket_policy(bucket):
                 "Effect":"Allow",
                 "Principal": "*",
                 "Action":["s3:GetObject"],
-                "Resource":["arn:aws:s3:::%s/*"]
+                "Resource":["arn:aws:s3:::%(bucket)s/*"]
+            },
+            {
+                "Sid":"DenyPyJamMetadata",
+                "Effect":"Deny",
+                "Principal": "*",
+                "Action":["s3:GetObject"],
+                "Resource":["arn:aws:s3:::%(bucket)s/%(prefix)s*"],
+                "Condition":{
+                    "StringNotEquals":{"aws:PrincipalAccount":"%(account)s"}
+                }
             }
         ]
     }
-    ''' % bucket.name
+    ''' % {'bucket': bucket.name, 'prefix': METADATA_PREFIX,
+           'account': account_id}
 
     policy = policy.strip()
 
@@ -0,0 +1,100 @@
+"""Process-wide registry of boto3 sessions, clients and resources"""
+
+import threading
+import boto3
+from botocore.config import Config
+from pyjam.constants import MAX_CONCURRENCY, CLIENT_MAX_RETRIES, \
+CONNECT_TIMEOUT
+
+_lock = threading.Lock()
+_sessions = {}
+_clients = {}
+_resources = {}
+_accounts = {}
+
+
+def client_config(max_pool_connections=MAX_CONCURRENCY,
+                  max_attempts=CLIENT_MAX_RETRIES):
+    """Botocore config shared by every client"""
+    options = dict(
+        max_pool_connections=max_pool_connections,
+        connect_timeout=CONNECT_TIMEOUT,
+        retries={
+            'mode': 'standard',
+            'max_attempts': max_attempts
+        })
+
+    # keep-alive is only supported by recent versions of botocore
+    if 'tcp_keepalive' in Config.OPTION_DEFAULTS:
+        options['tcp_keepalive'] = True
+
+    return Config(**options)
+
+
+def _get_session(profile_name):
+    """Session for profile_name. The caller must hold the lock"""
+    if profile_name not in _sessions:
+        _sessions[profile_name] = boto3.Session(profile_name=profile_name) \
+        if profile_name else boto3.Session()
+
+    return _sessions[profile_name]
+
+
+def get_session(profile_name=None):
+    """The session for profile_name, created on first use"""
+    with _lock:
+        return _get_session(profile_name)
+
+
+def _get_or_create(registry, method, service, profile_name, region_name,
+                   max_pool_connections, max_attempts):
+    """Look up a client or resource, creating it under the lock if missing"""
+    key = (profile_name, region_name, service, max_pool_connections,
+           max_attempts)
+    found = registry.get(key)
+
+    if found is not None:
+        return found
+
+    # sessions are not thread safe, so clients are created one at a time
+    with _lock:
+        if key not in registry:
+            session = _get_session(profile_name)
+            registry[key] = getattr(session, method)(
+                service,
+                region_name=region_name,
+                config=client_config(max_pool_connections, max_attempts))
+
+        return registry[key]
+
+
+def get_client(service,
+               profile_name=None,
+               region_name=None,
+               max_pool_connections=MAX_CONCURRENCY,
+               max_attempts=CLIENT_MAX_RETRIES):
+    """
+    The client for service in region_name with profile_name's credentials,
+    created on first use and shared by every thread after that.
+    """
+    return _get_or_create(_clients, 'client', service, profile_name,
+                          region_name, max_pool_connections, max_attempts)
+
+
+def get_resource(service,
+                 profile_name=None,
+                 region_name=None,
+                 max_pool_connections=MAX_CONCURRENCY,
+                 max_attempts=CLIENT_MAX_RETRIES):
+    """Like get_client, for a boto3 service resource"""
+    return _get_or_create(_resources, 'resource', service, profile_name,
+                          region_name, max_pool_connections, max_attempts)
+
+
+def get_account_id(profile_name=None):
+    """AWS account ID of profile_name's credentials, looked up once"""
+    if profile_name not in _accounts:
+        _accounts[profile_name] = get_client(
+            'sts', profile_name=profile_name).get_caller_identity()['Account']
+
+    return _accounts[profile_name]
@@ -0,0 +1,129 @@
+"""Utilities for adapting request rates to S3 throttling"""
+
+import random
+import re
+import threading
+import time
+from boto3.exceptions import S3UploadFailedError
+from botocore.exceptions import ClientError
+from pyjam.constants import BACKOFF_BASE, BACKOFF_CAP, THROTTLE_RETRIES
+
+THROTTLE_CODES = {
+    'SlowDown', 'Throttling', 'ThrottlingException', 'RequestLimitExceeded',
+    'RequestThrottled', 'TooManyRequests', 'ServiceUnavailable', '503'
+}
+
+
+def error_code(err):
+    """AWS error code of a ClientError, or of one wrapped by a transfer"""
+    if isinstance(err, ClientError):
+        return err.response.get('Error', {}).get('Code', '')
+
+    match = re.search(r'An error occurred \((\w+)\)', str(err))
+    return match.group(1) if match else ''
+
+
+def is_throttled(err):
+    """Return True if err is S3 asking for fewer requests"""
+    return error_code(err) in THROTTLE_CODES
+
+
+def backoff(attempt):
+    """Full jitter delay in seconds before retry number attempt"""
+    return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2**attempt))
+
+
+class AdaptiveLimiter:
+    """
+    AIMD limit on requests in flight. The limit grows by one after a
+    window of successes and halves when S3 throttles, at most once per
+    backoff period so a burst of throttled requests counts only once.
+    """
+
+    def __init__(self, max_limit, min_limit=1):
+        """Start at max_limit, the configured concurrency"""
+        self.max_limit = max_limit
+        self.min_limit = min_limit
+        self.limit = max_limit
+        self.in_flight = 0
+        self.successes = 0
+        self.decreased_at = 0.0
+        self.condition = threading.Condition()
+
+    def acquire(self):
+        """Wait until another request may be sent"""
+        with self.condition:
+            while self.in_flight >= self.limit:
+                self.condition.wait()
+
+            self.in_flight += 1
+
+    def release(self, throttled=False):
+        """Record the outcome of a request and adjust the limit"""
+        with self.condition:
+            self.in_flight -= 1
+
+            if throttled:
+                now = time.monotonic()
+                self.successes = 0
+
+                if now - self.decreased_at > BACKOFF_BASE:
+                    self.limit = max(self.min_limit, self.limit // 2)
+                    self.decreased_at = now
+
+            elif self.limit < self.max_limit:
+                self.successes += 1
+
+                if self.successes >= self.limit:
+                    self.limit += 1
+                    self.successes = 0
+
+            self.condition.notify_all()
+
+    def call(self, func, *args, **kwargs):
+        """Call func within the limit, retrying throttled calls"""
+        attempt = 0
+
+        while True:
+            throttled = False
+            self.acquire()
+
+            try:
+                return func(*args, **kwargs)
+
+            except (ClientError, S3UploadFailedError) as err:
+                throttled = is_throttled(err)
+
+                if not throttled or attempt >= THROTTLE_RETRIES:
+                    raise
+
+            finally:
+                self.release(throttled)
+
+            time.sleep(backoff(attempt))
+            attempt += 1
+
+
+class BandwidthLimiter:
+    """Token bucket shared by all transfers, capping bytes per second"""
+
+    def __init__(self, rate):
+        """Allow rate bytes per second, with bursts of up to a second"""
+        self.rate = rate
+        self.available = rate
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def consume(self, bytes_transferred):
+        """Transfer callback, blocking until the bytes may be sent"""
+        with self.lock:
+            now = time.monotonic()
+            self.available = min(
+                self.rate,
+                self.available + (now - self.updated) * self.rate) - \
+            bytes_transferred
+            self.updated = now
+            delay = -self.available / self.rate
+
+        if delay > 0:
+            time.sleep(delay)
@@ -0,0 +1,155 @@
+"""Utilities for walking local directory trees"""
+
+import os
+import re
+from stat import S_ISDIR, S_ISREG
+from fnmatch import translate
+from pyjam.utils.headers import HEADERS_FILE
+
+IGNORE_FILE = '.jamignore'
+
+
+class IgnoreRules:
+    """
+    Glob patterns compiled once into a single regex per kind.
+    Patterns containing a slash match the path relative to the root,
+    others match the entry name at any depth. A trailing slash only
+    matches directories.
+    """
+
+    def __init__(self, patterns=()):
+        """Compile the given patterns"""
+        groups = {}
+
+        for pattern in patterns:
+            pattern = pattern.strip()
+
+            if not pattern or pattern.startswith('#'):
+                continue
+
+            dir_only = pattern.endswith('/')
+            pattern = pattern.rstrip('/')
+            anchored = '/' in pattern
+            groups.setdefault((anchored, dir_only), []).append(
+                translate(pattern.lstrip('/')))
+
+        self.rules = [(anchored, dir_only, re.compile('|'.join(regexes)))
+                      for (anchored, dir_only), regexes in groups.items()]
+
+    @classmethod
+    def load(cls, root, excludes=()):
+        """Build rules from root's ignore file plus extra exclude globs"""
+        patterns = [IGNORE_FILE, HEADERS_FILE]
+
+        try:
+            with open(os.path.join(root, IGNORE_FILE)) as file:
+                patterns.extend(file.read().splitlines())
+
+        except FileNotFoundError:
+            pass
+
+        return cls(patterns + list(excludes))
+
+    def match(self, key, name, is_dir):
+        """Return True if the entry should be skipped"""
+        for anchored, dir_only, regex in self.rules:
+            if dir_only and not is_dir:
+                continue
+
+            if regex.match(key if anchored else name):
+                return True
+
+        return False
+
+    def match_path(self, key, is_dir):
+        """Return True if key, or any directory above it, is skipped"""
+        names = key.split('/') if key else []
+
+        for depth, name in enumerate(names, 1):
+            if self.match('/'.join(names[:depth]), name,
+                          is_dir or depth < len(names)):
+                return True
+
+        return False
+
+
+def walk_files(root, rules=None, ordered=False, prefix=''):
+    """
+    Yield (path, key, stat) for every file under root without recursion.
+    Entries come from os.scandir so type checks and stat results are
+    reused, and ignored directories are pruned before they are opened.
+    With ordered, keys are yielded in the same byte order S3 lists them.
+    Keys start with prefix, which is how root is keyed in the bucket.
+    """
+    rules = rules or IgnoreRules()
+    stack = [(True, root, prefix, None)]
+
+    while stack:
+        is_dir, path, key, stat = stack.pop()
+
+        if not is_dir:
+            yield path, key, stat
+            continue
+
+        children = []
+
+        with os.scandir(path) as entries:
+            for entry in entries:
+                child_key = key + entry.name
+                child_is_dir = entry.is_dir()
+
+                if rules.match(child_key, entry.name, child_is_dir):
+                    continue
+
+                if child_is_dir:
+                    children.append((True, entry.path, child_key + '/', None))
+
+                elif entry.is_file():
+                    children.append(
+                        (False, entry.path, child_key, entry.stat()))
+
+        # directories sort by their key prefix, so a depth first walk of
+        # sorted children visits keys in order. code point order of str
+        # is the same as the UTF-8 byte order S3 uses
+        if ordered:
+            children.sort(key=lambda child: child[2], reverse=True)
+
+        stack.extend(children)
+
+
+def walk_keys(root, keys, rules=None):
+    """
+    Yield (path, key, stat) for each of keys, relative to root, that is
+    still a file, and for every file below those that are directories.
+    The empty key stands for root itself.
+    """
+    rules = rules or IgnoreRules()
+    keys = set(keys)
+
+    for key in sorted(keys):
+        parents = key.split('/')[:-1] if key else []
+
+        # a key inside another changed directory is walked with it
+        if '' in keys and key or any('/'.join(parents[:depth]) in keys
+                                     for depth in range(1, len(parents) + 1)):
+            continue
+
+        path = os.path.join(root, key) if key else root
+
+        try:
+            stat = os.stat(path)
+
+        except OSError:
+            continue
+
+        is_dir = S_ISDIR(stat.st_mode)
+
+        if rules.match_path(key, is_dir):
+            continue
+
+        if is_dir:
+            yield from walk_files(path, rules,
+                                  prefix=key + '/' if key else '')
+
+        elif S_ISREG(stat.st_mode):
+            yield path, key, stat
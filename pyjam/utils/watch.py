@@ -0,0 +1,189 @@
+"""Utilities for watching a local tree for changed keys"""
+
+import os
+import time
+from pyjam.constants import WATCH_DEBOUNCE, WATCH_INTERVAL
+from pyjam.utils.walk import walk_files
+
+try:
+    from inotify_simple import INotify, flags
+except ImportError:
+    INotify = None
+
+
+def inotify_available():
+    """Return True if the optional inotify_simple package is installed"""
+    return INotify is not None
+
+
+def snapshot(root, rules):
+    """Map each key under root to its (size, mtime_ns, inode)"""
+    return {
+        key: (stat.st_size, stat.st_mtime_ns, stat.st_ino)
+        for _, key, stat in walk_files(root, rules)
+    }
+
+
+def child_key(parent, name):
+    """Key of name inside the directory keyed parent"""
+    return parent + '/' + name if parent else name
+
+
+class PollingWatcher:
+    """Detects changes by comparing stat snapshots of the tree"""
+
+    def __init__(self, root, rules, interval=WATCH_INTERVAL):
+        """Take the first snapshot of root"""
+        self.root = root
+        self.rules = rules
+        self.interval = interval
+        self.state = snapshot(root, rules)
+
+    def poll(self):
+        """Return keys added, changed or removed since the last poll"""
+        state = snapshot(self.root, self.rules)
+        changed = {
+            key
+            for key in state.keys() | self.state.keys()
+            if state.get(key) != self.state.get(key)
+        }
+        self.state = state
+
+        return changed
+
+    def changes(self, debounce=WATCH_DEBOUNCE):
+        """Yield sets of changed keys once the tree is quiet again"""
+        while True:
+            time.sleep(self.interval)
+            changed = self.poll()
+
+            while changed:
+                time.sleep(debounce)
+                more = self.poll()
+
+                if not more:
+                    yield changed
+                    break
+
+                changed |= more
+
+
+class InotifyWatcher:
+    """Detects changes with inotify watches on every directory"""
+
+    def __init__(self, root, rules):
+        """Watch root and every directory below it that is not ignored"""
+        self.root = root
+        self.rules = rules
+        self.inotify = INotify()
+        self.mask = flags.CLOSE_WRITE | flags.CREATE | flags.DELETE | \
+        flags.MOVED_FROM | flags.MOVED_TO | flags.ATTRIB
+        self.dirs = {}
+        self.watch_tree('')
+
+    def watch_tree(self, key):
+        """Add watches for the directory key and those below it"""
+        stack = [key]
+
+        while stack:
+            key = stack.pop()
+            path = os.path.join(self.root, key) if key else self.root
+
+            try:
+                wd = self.inotify.add_watch(path, self.mask)
+
+                with os.scandir(path) as entries:
+                    entries = list(entries)
+
+            # removed again before it could be watched
+            except OSError:
+                continue
+
+            self.dirs[wd] = key
+
+            for entry in entries:
+                name = child_key(key, entry.name)
+
+                if entry.is_dir() and \
+                not self.rules.match(name, entry.name, True):
+                    stack.append(name)
+
+    def unwatch_tree(self, key):
+        """Remove watches for the directory key and those below it"""
+        for wd, name in list(self.dirs.items()):
+            if name == key or name.startswith(key + '/'):
+                del self.dirs[wd]
+
+                try:
+                    self.inotify.rm_watch(wd)
+
+                except OSError:
+                    pass
+
+    def read(self, timeout=None):
+        """Return keys touched by events, waiting up to timeout seconds"""
+        changed = set()
+        events = self.inotify.read(
+            timeout=None if timeout is None else int(timeout * 1000))
+
+        for event in events:
+            # events were dropped, so the whole tree has to be checked
+            if event.mask & flags.Q_OVERFLOW:
+                changed.add('')
+                continue
+
+            if event.mask & flags.IGNORED:
+                self.dirs.pop(event.wd, None)
+                continue
+
+            parent = self.dirs.get(event.wd)
+
+            if parent is None or not event.name:
+                continue
+
+            key = child_key(parent, event.name)
+            changed.add(key)
+
+            if not event.mask & flags.ISDIR:
+                continue
+
+            if event.mask & flags.MOVED_FROM:
+                self.unwatch_tree(key)
+
+            elif event.mask & (flags.CREATE | flags.MOVED_TO) and \
+            not self.rules.match(key, event.name, True):
+                self.watch_tree(key)
+
+        return changed
+
+    def changes(self, debounce=WATCH_DEBOUNCE):
+        """Yield sets of changed keys once the tree is quiet again"""
+        while True:
+            changed = self.read()
+
+            while True:
+                more = self.read(debounce)
+
+                if not more:
+                    break
+
+                changed |= more
+
+            if changed:
+                yield changed
+
+
+def get_watcher(root, rules):
+    """
+    Watcher for root, using inotify where it is available and falling
+    back to polling stat snapshots of the tree otherwise.
+    """
+    if inotify_available():
+        try:
+            return InotifyWatcher(root, rules)
+
+        except OSError as err:
+            print('Unable to watch {0} with inotify, polling instead. '.format(
+                root) + str(err) + '\n')
+
+    return PollingWatcher(root, rules)
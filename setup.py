@@ -12,6 +12,10 @@ setup(
     packages=find_packages(exclude=['test*']),
     url='https://github.com/tyh835/pydeploy',
     install_requires=['click', 'boto3'],
+    extras_require={
+        'brotli': ['brotli'],
+        'watch': ['inotify_simple']
+    },
     entry_points='''
         [console_scripts]
         jam=pyjam.cli:cli
@@ -0,0 +1,83 @@
+"""
+Startup benchmark for the jam CLI. Runs commands that do not call AWS
+under `python -X importtime` and fails if they import boto3 or botocore,
+or if importing pyjam.cli takes longer than the budget.
+
+Usage: python startup_benchmark.py [--budget MS] [--runs N]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+COMMANDS = [['--help'], ['--version'], ['list', '--help'], ['sync', '--help'],
+            ['deploy', '--help'], ['status', '--help'], ['setup', '--help'],
+            ['setup', 'certificate', '--help']]
+HEAVY_MODULES = ('boto3', 'botocore', 's3transfer')
+SCRIPT = 'import sys; from pyjam.cli import cli; cli(sys.argv[1:], prog_name="jam")'
+
+
+def import_times(args):
+    """Run jam with args and return the cumulative import time per module"""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', SCRIPT] + args,
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+        check=True)
+    times = {}
+
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+
+        _, cumulative, module = line.split('|')
+        times[module.strip()] = int(cumulative)
+
+    return times
+
+
+def main():
+    """Benchmark every command and exit with 1 on a regression"""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument(
+        '--budget',
+        type=float,
+        default=100.0,
+        help='Slowest allowed import of pyjam.cli in ms (default: 100).')
+    parser.add_argument(
+        '--runs',
+        type=int,
+        default=5,
+        help='Runs per command, of which the fastest counts (default: 5).')
+    options = parser.parse_args()
+    failures = []
+
+    for args in COMMANDS:
+        command = ' '.join(['jam'] + args)
+        runs = [import_times(args) for _ in range(max(1, options.runs))]
+        elapsed = min(times.get('pyjam.cli', 0) for times in runs) / 1000
+        heavy = sorted(
+            module for module in runs[0]
+            if module.split('.')[0] in HEAVY_MODULES)
+
+        print('{0:<32} {1:>8.1f} ms'.format(command, elapsed))
+
+        if heavy:
+            failures.append('{0} imports {1}'.format(command,
+                                                      ', '.join(heavy[:3])))
+
+        if elapsed > options.budget:
+            failures.append('{0} takes {1:.1f} ms, over the {2:.0f} ms '
+                            'budget'.format(command, elapsed, options.budget))
+
+    for failure in failures:
+        print('FAIL: ' + failure)
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""Tests for pyjam.utils.checksum"""
+
+import os
+from functools import reduce
+from hashlib import md5
+import pytest
+from pyjam.utils import checksum
+from pyjam.utils.checksum import choose_part_size, generate_checksum
+
+CHUNK = 1024
+MIB = 1024 * 1024
+
+
+def reference_checksum(path, chunk_size):
+    """The previous implementation, one bytes object per part"""
+    hashes = []
+
+    with open(path, 'rb') as file:
+        while True:
+            data = file.read(chunk_size)
+
+            if not data:
+                break
+
+            hashes.append(md5(data))
+
+    if not hashes:
+        return '""'
+
+    if len(hashes) == 1:
+        return '"{0}"'.format(hashes[0].hexdigest())
+
+    digests = (h.digest() for h in hashes)
+    data_hash = md5(reduce(lambda x, y: x + y, digests))
+    return '"{0}-{1}"'.format(data_hash.hexdigest(), len(hashes))
+
+
+@pytest.mark.parametrize('size', [
+    0, 1, CHUNK - 1, CHUNK, CHUNK + 1, 3 * CHUNK, 7 * CHUNK + 5, 64 * CHUNK
+])
+def test_matches_reference(tmp_path, size):
+    """ETags match the previous implementation for 0, 1 and many parts"""
+    path = str(tmp_path / 'file')
+
+    with open(path, 'wb') as file:
+        file.write(os.urandom(size))
+
+    assert generate_checksum(path, CHUNK) == reference_checksum(path, CHUNK)
+
+
+@pytest.mark.parametrize('size', [CHUNK, 4 * CHUNK + 3, 12 * CHUNK])
+def test_parts_larger_than_buffer(tmp_path, monkeypatch, size):
+    """Parts read a buffer at a time hash the same as whole parts"""
+    monkeypatch.setattr(checksum, 'CHUNK_SIZE', CHUNK // 4)
+    monkeypatch.setattr(checksum, '_buffers', type(checksum._buffers)())
+    path = str(tmp_path / 'file')
+
+    with open(path, 'wb') as file:
+        file.write(os.urandom(size))
+
+    assert generate_checksum(path, CHUNK) == reference_checksum(path, CHUNK)
+
+
+def test_empty_file(tmp_path):
+    """An empty file has the empty ETag"""
+    path = tmp_path / 'empty'
+    path.write_bytes(b'')
+
+    assert generate_checksum(str(path)) == '""'
+
+
+def test_single_part_is_plain_md5(tmp_path):
+    """A file of one part has the md5 of its content as ETag"""
+    path = tmp_path / 'small'
+    path.write_bytes(b'hello world')
+
+    assert generate_checksum(str(path)) == '"{0}"'.format(
+        md5(b'hello world').hexdigest())
+
+
+@pytest.mark.parametrize('size, part_size', [
+    (0, 8 * MIB),
+    (800 * MIB, 8 * MIB),
+    (1024 * MIB, 16 * MIB),
+    (4096 * MIB, 64 * MIB),
+    (5 * 1024 * 1024 * MIB, 5 * 1024 * MIB),
+])
+def test_choose_part_size(size, part_size):
+    """Multi-GB files are split into at most about 100 parts"""
+    assert choose_part_size(size) == part_size
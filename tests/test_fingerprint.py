@@ -0,0 +1,95 @@
+"""Tests for pyjam.utils.fingerprint"""
+
+from pyjam.utils import pipeline
+from pyjam.utils.checksum import generate_checksum
+from pyjam.utils.fingerprint import fingerprint_origin, rewrite_references
+from pyjam.utils.pipeline import LocalFile
+from pyjam.utils.plan import SyncPlan
+
+RENAMES = {'b.css': 'b.0123456789.css', 'img/x.png': 'img/x.abcdef0123.png'}
+
+
+def test_rewrites_import_url():
+    """@import url(...) is rewritten like a bare @import"""
+    text = '@import url(b.css); @import "b.css"; @import url(\'b.css\') print;'
+
+    assert rewrite_references(text, 'a.css', RENAMES) == (
+        '@import url(b.0123456789.css); @import "b.0123456789.css"; '
+        '@import url(\'b.0123456789.css\') print;')
+
+
+def test_rewrites_url_relative_to_key():
+    """url() references resolve against the referencing file"""
+    text = 'a{background:url("../img/x.png")}'
+
+    assert rewrite_references(text, 'css/a.css', RENAMES) == \
+        'a{background:url("../img/x.abcdef0123.png")}'
+
+
+def test_fingerprint_origin():
+    """Fingerprinted keys map back to the key they were named after"""
+    assert fingerprint_origin('img/x.abcdef0123.png') == 'img/x.png'
+    assert fingerprint_origin('img/x.png') is None
+    assert fingerprint_origin('notes.0123456789') is None
+
+
+def test_keeps_earlier_fingerprints():
+    """Earlier versions of local assets survive, removed assets do not"""
+    remote = {
+        'b.css': '"1"',
+        'b.0123456789.css': '"1"',
+        'gone.0123456789.css': '"2"',
+        'gone.css': '"2"'
+    }
+    plan = SyncPlan(remote, fingerprint=True)
+    plan.local_keys = {'b.css', 'b.fedcba9876.css'}
+
+    assert sorted(action.key for action in plan.plan_deletes()) == \
+        ['gone.0123456789.css', 'gone.css']
+
+
+def test_manifest_keeps_earlier_fingerprints():
+    """Retained fingerprints are written to the manifest"""
+    remote = {'b.0123456789.css': '"1"', 'gone.0123456789.css': '"2"'}
+    plan = SyncPlan(remote, {'b.0123456789.css': {'CacheControl': 'x'}},
+                    fingerprint=True)
+    plan.local_keys = {'b.css'}
+    plan.complete([])
+
+    assert plan.manifest() == {
+        'b.0123456789.css': ('"1"', None, {
+            'CacheControl': 'x'
+        })
+    }
+
+
+def test_fingerprints_imports_first(tmp_path, monkeypatch):
+    """A stylesheet is rewritten after the stylesheets it imports"""
+    monkeypatch.setattr(pipeline, 'CACHE_DIR', str(tmp_path / 'cache'))
+    sources = {
+        'a.css': '@import "b.css";',
+        'b.css': '@import url(c.css); b{}',
+        'c.css': 'c{}'
+    }
+    files = []
+
+    for key, text in sources.items():
+        path = tmp_path / key
+        path.write_text(text)
+        files.append(
+            LocalFile(
+                str(path), key, generate_checksum(str(path)),
+                len(text), None, None))
+
+    keys = {}
+
+    for file in pipeline.fingerprint_files(iter(files)):
+        if fingerprint_origin(file.key):
+            keys[fingerprint_origin(file.key)] = file
+
+    with open(keys['a.css'].path) as file:
+        assert file.read() == '@import "{0}";'.format(keys['b.css'].key)
+
+    with open(keys['b.css'].path) as file:
+        assert file.read() == '@import url({0}); b{{}}'.format(
+            keys['c.css'].key)